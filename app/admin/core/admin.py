@@ -1,5 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group, User as AuthUser
+from django.db import connection
+from django.db.models import Count, Q
 
 from core.models import (
     Family,
@@ -22,10 +24,22 @@ from core.models import (
     PVZ,
 )
 
+from core.signals import publish
+from app.steps_bot.services.segments import compile_sql, recipients_count_query
+
 admin.site.unregister(Group)
 admin.site.unregister(AuthUser)
 
 
+@admin.action(description="Загрузить медиа в Telegram (получить file_id)")
+def warm_up_media(modeladmin, request, queryset):
+    """
+    Просит бота загрузить все медиа без file_id в служебный чат.
+    """
+    publish("media_warmup")
+    modeladmin.message_user(request, "Бот загрузит медиа без file_id в фоне.")
+
+
 @admin.register(Family)
 class FamilyAdmin(admin.ModelAdmin):
     list_display = ("id", "name", "balance", "step_count")
@@ -64,6 +78,7 @@ class ContentAdmin(admin.ModelAdmin):
     list_editable = ("media_type", "telegram_file_id", "media_url")
     list_filter = ("media_type",)
     search_fields = ("slug",)
+    actions = (warm_up_media,)
 
 
 @admin.register(User)
@@ -100,6 +115,7 @@ class FAQAdmin(admin.ModelAdmin):
     list_display  = ("slug", "question", "media_type", "telegram_file_id", "media_url")
     list_editable = ("media_type", "telegram_file_id", "media_url")
     search_fields = ("slug", "question")
+    actions = (warm_up_media,)
 
 
 @admin.register(CatalogCategory)
@@ -113,6 +129,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ("id", "title", "category", "price", "is_active", "media_type")
     list_filter = ("category", "is_active", "media_type")
     search_fields = ("title",)
+    actions = (warm_up_media,)
 
 
 class OrderItemInline(admin.TabularInline):
@@ -195,11 +212,47 @@ class PromoCodeAdmin(admin.ModelAdmin):
 
 @admin.register(Broadcast)
 class BroadcastAdmin(admin.ModelAdmin):
-    list_display = ("id", "status", "scheduled_at", "sent_at")
+    list_display = ("id", "status", "scheduled_at", "sent_at", "delivered", "failed", "pending")
     list_filter = ("status",)
     search_fields = ("id", "text")
-    fields = ("text", "media_type", "media_file", "telegram_file_id", "media_url", "scheduled_at", "sent_at")
-    readonly_fields = ("sent_at", "status")
+    fields = ("text", "media_type", "media_file", "telegram_file_id", "media_url", "segment", "recipients", "scheduled_at", "sent_at")
+    readonly_fields = ("sent_at", "status", "recipients")
+    actions = (warm_up_media,)
+
+    @admin.display(description="Получателей")
+    def recipients(self, obj):
+        """
+        Предпросмотр числа получателей тем же запросом, которым бот выбирает аудиторию.
+        """
+        if obj is None or obj.pk is None:
+            return "—"
+        try:
+            sql, params = compile_sql(recipients_count_query(obj.segment))
+        except ValueError as e:
+            return f"Ошибка в сегменте: {e}"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+
+    def get_queryset(self, request):
+        # Счётчики доставок считаются одним агрегирующим запросом вместе со списком
+        return super().get_queryset(request).annotate(
+            delivered_count=Count("deliveries", filter=Q(deliveries__status="sent")),
+            failed_count=Count("deliveries", filter=Q(deliveries__status="failed")),
+            pending_count=Count("deliveries", filter=Q(deliveries__status="pending")),
+        )
+
+    @admin.display(description="Доставлено", ordering="delivered_count")
+    def delivered(self, obj):
+        return obj.delivered_count
+
+    @admin.display(description="Ошибок", ordering="failed_count")
+    def failed(self, obj):
+        return obj.failed_count
+
+    @admin.display(description="В очереди", ordering="pending_count")
+    def pending(self, obj):
+        return obj.pending_count
 
 
 @admin.register(Referral)
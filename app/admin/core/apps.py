@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
-    verbose_name = 'Фильтры'
\ No newline at end of file
+    verbose_name = 'Фильтры'
+
+    def ready(self):
+        from core import signals  # noqa: F401
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_broadcast_pvz_referral_alter_botsetting_options'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='broadcast',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ожидает'), ('in_progress', 'Отправляется'), ('sent', 'Отправлена'), ('failed', 'Ошибка')], default='pending', max_length=16, verbose_name='Статус'),
+        ),
+        migrations.CreateModel(
+            name='BroadcastDelivery',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('in_progress', 'Отправляется'), ('sent', 'Отправлена'), ('failed', 'Ошибка')], default='pending', max_length=16, verbose_name='Статус')),
+                ('attempts', models.SmallIntegerField(default=0, verbose_name='Попыток')),
+                ('error', models.CharField(blank=True, max_length=255, null=True, verbose_name='Ошибка')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Доставлено')),
+            ],
+            options={
+                'verbose_name': 'Доставка рассылки',
+                'verbose_name_plural': 'Доставки рассылок',
+                'db_table': 'broadcast_deliveries',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,7 +1,11 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 
+from app.steps_bot.services.segments import SEGMENT_KEYS, parse_segment
+from core.fields import SafeJSONField
+
 class UserRoleChoices(models.TextChoices):
     USER = "user", "Пользователь"
     ADMIN = "admin", "Админ"
@@ -26,6 +30,13 @@ class OrderStatusChoices(models.TextChoices):
     DELIVERED = "delivered", "Доставлен"
 
 
+class BroadcastStatusChoices(models.TextChoices):
+    PENDING = "pending", "Ожидает"
+    IN_PROGRESS = "in_progress", "Отправляется"
+    SENT = "sent", "Отправлена"
+    FAILED = "failed", "Ошибка"
+
+
 class Family(models.Model):
     id = models.AutoField(primary_key=True)
     name = models.CharField(_("Название семьи"), max_length=100, unique=True)
@@ -317,9 +328,16 @@ class Broadcast(models.Model):
     telegram_file_id = models.CharField(_("Telegram file_id"), max_length=255, null=True, blank=True)
     media_url = models.CharField(_("URL медиа"), max_length=1024, null=True, blank=True)
     media_file = models.FileField(_("Файл медиа"), upload_to="uploads/broadcasts", null=True, blank=True)
+    media_hash = models.CharField(_("Хэш файла"), max_length=64, null=True, blank=True)
+    segment = SafeJSONField(
+        _("Сегмент"),
+        null=True,
+        blank=True,
+        help_text=_("Пусто — все активные пользователи. Поля: %s") % ", ".join(SEGMENT_KEYS),
+    )
     scheduled_at = models.DateTimeField(_("Отправить в"), null=True, blank=True)
     sent_at = models.DateTimeField(_("Отправлено"), null=True, blank=True)
-    status = models.CharField(_("Статус"), max_length=10, default="pending")
+    status = models.CharField(_("Статус"), max_length=16, choices=BroadcastStatusChoices.choices, default=BroadcastStatusChoices.PENDING)
 
     class Meta:
         db_table = "broadcasts"
@@ -327,6 +345,39 @@ class Broadcast(models.Model):
         verbose_name = _("Рассылка")
         verbose_name_plural = _("Рассылки")
 
+    def clean(self) -> None:
+        try:
+            parse_segment(self.segment)
+        except ValueError as e:
+            raise ValidationError({"segment": str(e)})
+
+    def save(self, *args, **kwargs) -> None:
+        """
+        Сбрасывает telegram_file_id и хэш при замене файла.
+        """
+        if self.pk:
+            old = Broadcast.objects.filter(pk=self.pk).only("media_file").first()
+            if old and old.media_file != self.media_file:
+                self.telegram_file_id = None
+                self.media_hash = None
+        super().save(*args, **kwargs)
+
+
+class BroadcastDelivery(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    broadcast = models.ForeignKey(Broadcast, on_delete=models.CASCADE, related_name="deliveries", verbose_name=_("Рассылка"))
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+", verbose_name=_("Пользователь"))
+    status = models.CharField(_("Статус"), max_length=16, choices=BroadcastStatusChoices.choices, default=BroadcastStatusChoices.PENDING)
+    attempts = models.SmallIntegerField(_("Попыток"), default=0)
+    error = models.CharField(_("Ошибка"), max_length=255, null=True, blank=True)
+    sent_at = models.DateTimeField(_("Доставлено"), null=True, blank=True)
+
+    class Meta:
+        db_table = "broadcast_deliveries"
+        managed = False
+        verbose_name = _("Доставка рассылки")
+        verbose_name_plural = _("Доставки рассылок")
+
 
 class Referral(models.Model):
     id = models.BigAutoField(primary_key=True)
@@ -0,0 +1,61 @@
+import json
+import logging
+
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+
+from core.models import (
+    FAQ,
+    BotSetting,
+    Broadcast,
+    CatalogCategory,
+    Content,
+    Product,
+    PromoGroup,
+    TemperatureCoefficient,
+    WalkFormCoefficient,
+)
+
+logger = logging.getLogger(__name__)
+
+# Канал, который слушает бот (app/steps_bot/services/invalidation_bus.py)
+CHANNEL = "cache_invalidation"
+
+# Модели, об изменении которых бот должен узнавать сразу
+CACHED_MODELS = (
+    WalkFormCoefficient,
+    TemperatureCoefficient,
+    Content,
+    FAQ,
+    CatalogCategory,
+    Product,
+    BotSetting,
+    PromoGroup,
+    # Рассылки: бот просыпается сразу, а не на следующем опросе
+    Broadcast,
+)
+
+
+def publish(table, key=None):
+    """
+    Отправляет боту событие об изменении таблицы после коммита транзакции.
+    """
+    payload = json.dumps({"table": table, "key": None if key is None else str(key)})
+
+    def _notify():
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+        except Exception:
+            logger.exception("Не удалось отправить уведомление об изменении %s", table)
+
+    transaction.on_commit(_notify)
+
+
+def _on_change(sender, instance, **kwargs):
+    publish(sender._meta.db_table, instance.pk)
+
+
+for _model in CACHED_MODELS:
+    post_save.connect(_on_change, sender=_model, dispatch_uid=f"invalidate_{_model._meta.db_table}_save")
+    post_delete.connect(_on_change, sender=_model, dispatch_uid=f"invalidate_{_model._meta.db_table}_delete")
@@ -6,6 +6,8 @@ from app.steps_bot.db.models.family import (
     FamilyInviteStatus,
 )
 from app.steps_bot.db.models.walk import WalkForm, WalkFormCoefficient
+from app.steps_bot.db.models.active_walk import ActiveWalk
+from app.steps_bot.db.models.daily_steps import DailyStepUsage
 from app.steps_bot.db.models.coefficients import TemperatureCoefficient
 from app.steps_bot.db.models.captions import MediaType, Content
 from app.steps_bot.db.models.faq import FAQ
@@ -19,7 +21,7 @@ from app.steps_bot.db.models.catalog import (
     OrderItem,
     UserAddress,
 )
-from app.steps_bot.db.models.broadcast import Broadcast, BroadcastStatus
+from app.steps_bot.db.models.broadcast import Broadcast, BroadcastDelivery, BroadcastStatus
 from app.steps_bot.db.models.referral import Referral
 from app.steps_bot.db.models.pvz import PVZ
 
@@ -32,6 +34,8 @@ __all__ = [
     "Family",
     "WalkForm",
     "WalkFormCoefficient",
+    "ActiveWalk",
+    "DailyStepUsage",
     "TemperatureCoefficient",
     "MediaType",
     "Content",
@@ -48,6 +52,7 @@ __all__ = [
     "OwnerType",
     "OperationType",
     "Broadcast",
+    "BroadcastDelivery",
     "BroadcastStatus",
     "Referral",
     "PVZ",
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import Optional
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    DateTime,
+    Enum,
+    Float,
+    Integer,
+    SmallInteger,
+    String,
+    func,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.steps_bot.db.models.base import Base
+from app.steps_bot.db.models.walk import WalkForm
+from app.steps_bot.db.utils import enum_values
+
+
+class ActiveWalk(Base):
+    """
+    Контрольная точка незавершённой прогулки для восстановления после рестарта.
+    """
+    __tablename__ = "active_walks"
+
+    telegram_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    message_id: Mapped[Optional[int]] = mapped_column(BigInteger)
+
+    lat: Mapped[float] = mapped_column(Float, nullable=False)
+    lon: Mapped[float] = mapped_column(Float, nullable=False)
+    coords_ts: Mapped[float] = mapped_column(Float, nullable=False)
+
+    steps: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    step_goal: Mapped[int] = mapped_column(Integer, nullable=False)
+    was_over_speed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+    walk_form: Mapped[WalkForm] = mapped_column(
+        Enum(WalkForm, values_callable=enum_values, name="walkform"),
+        nullable=False,
+    )
+    multiplier: Mapped[int] = mapped_column(SmallInteger, default=1, nullable=False)
+    temp_c: Mapped[Optional[int]] = mapped_column(SmallInteger)
+    temp_updated_at: Mapped[Optional[float]] = mapped_column(Float)
+
+    started_at: Mapped[float] = mapped_column(Float, nullable=False)
+    last_update_at: Mapped[float] = mapped_column(Float, nullable=False, index=True)
+    live_until: Mapped[Optional[float]] = mapped_column(Float)
+    # Процесс бота, который ведёт прогулку в памяти: только он пишет контрольную
+    # точку и начисляет за прогулку
+    owner: Mapped[Optional[str]] = mapped_column(String(64))
+
+    updated_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return f"<ActiveWalk tg={self.telegram_id} steps={self.steps}>"
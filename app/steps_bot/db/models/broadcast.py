@@ -4,7 +4,8 @@ import enum
 import datetime as dt
 from typing import Optional
 
-from sqlalchemy import DateTime, Enum, Integer, String, Text, func, Index
+from sqlalchemy import BigInteger, DateTime, Enum, ForeignKey, Integer, SmallInteger, String, Text, UniqueConstraint, func, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.steps_bot.db.models.base import Base
@@ -14,6 +15,7 @@ from app.steps_bot.db.utils import enum_values
 
 class BroadcastStatus(str, enum.Enum):
     PENDING = "pending"
+    IN_PROGRESS = "in_progress"
     SENT = "sent"
     FAILED = "failed"
 
@@ -33,6 +35,11 @@ class Broadcast(Base):
     telegram_file_id: Mapped[Optional[str]] = mapped_column(String(255))
     media_url: Mapped[Optional[str]] = mapped_column(String(1024))
     media_file: Mapped[Optional[str]] = mapped_column(String(1024))
+    # sha256 локального файла: рассылки с тем же файлом берут готовый file_id
+    media_hash: Mapped[Optional[str]] = mapped_column(String(64), index=True)
+
+    # Сегмент аудитории (см. services/segments.py); NULL — все активные пользователи
+    segment: Mapped[Optional[dict]] = mapped_column(JSONB)
 
     scheduled_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True), index=True)
     sent_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True))
@@ -43,6 +50,10 @@ class Broadcast(Base):
         index=True,
     )
 
+    # Захват рассылки воркером: пока lease_until в будущем, её не берут другие реплики
+    claimed_by: Mapped[Optional[str]] = mapped_column(String(64))
+    lease_until: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True))
+
     created_at: Mapped[dt.datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
@@ -52,4 +63,30 @@ class Broadcast(Base):
     )
 
 
+class BroadcastDelivery(Base):
+    """
+    Доставка рассылки одному пользователю: по этим строкам рассылка продолжается после рестарта.
+    """
+    __tablename__ = "broadcast_deliveries"
 
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    broadcast_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("broadcasts.id", ondelete="CASCADE"), nullable=False
+    )
+    user_id: Mapped[int] = mapped_column(
+        BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    status: Mapped[BroadcastStatus] = mapped_column(
+        Enum(BroadcastStatus, values_callable=enum_values, name="broadcaststatus"),
+        default=BroadcastStatus.PENDING,
+        server_default=BroadcastStatus.PENDING.value,
+        nullable=False,
+    )
+    attempts: Mapped[int] = mapped_column(SmallInteger, default=0, server_default="0", nullable=False)
+    error: Mapped[Optional[str]] = mapped_column(String(255))
+    sent_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True))
+
+    __table_args__ = (
+        UniqueConstraint("broadcast_id", "user_id", name="uq_delivery_broadcast_user"),
+        Index("ix_delivery_broadcast_status", "broadcast_id", "status", "user_id"),
+    )
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import datetime as dt
+
+from sqlalchemy import BigInteger, Date, DateTime, ForeignKey, Integer, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.steps_bot.db.models.base import Base
+
+
+class DailyStepUsage(Base):
+    """
+    Сколько шагов пользователю засчитано за календарный день (для дневного лимита).
+    """
+    __tablename__ = "daily_step_usage"
+
+    user_id: Mapped[int] = mapped_column(
+        BigInteger,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    day: Mapped[dt.date] = mapped_column(Date, primary_key=True)
+    steps_used: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return f"<DailyStepUsage user={self.user_id} {self.day}={self.steps_used}>"
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import asyncio
 from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from typing import Any, Dict, List, Optional, Tuple
 from datetime import date as date_type
 from datetime import datetime, timezone, timedelta
 
 from sqlalchemy import select, delete
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.steps_bot.db.session import AsyncSessionLocal
@@ -18,13 +21,94 @@ from app.steps_bot.db.models.catalog import (
 from app.steps_bot.db.models.user import User
 from app.steps_bot.db.models.family import Family
 from app.steps_bot.db.models.pvz import PVZ
+from app.steps_bot.storage.user_ids import TelegramId, UserId, user_ids
+
+
+class _RequestSession:
+    """
+    Сессия одного апдейта: открывается при первом get_session() и живёт до
+    конца обработки. Используется только из задачи, в которой открыт апдейт.
+    """
+    __slots__ = ("task", "session", "depth", "closed")
+
+    def __init__(self) -> None:
+        self.task = asyncio.current_task()
+        self.session: Optional[AsyncSession] = None
+        self.depth = 0
+        self.closed = False
+
+    def usable(self) -> bool:
+        return not self.closed and self.task is asyncio.current_task()
+
+    def acquire(self) -> AsyncSession:
+        if self.session is None:
+            self.session = AsyncSessionLocal()
+        return self.session
+
+    async def commit(self) -> None:
+        # Коммитим и чтение: транзакция не должна висеть idle in transaction
+        # на время запросов к Telegram, соединение возвращается в пул
+        await self.session.commit()
+
+    async def rollback(self) -> None:
+        # Отсоединяем объекты до отката, чтобы загруженные атрибуты остались
+        # доступны вызывающему коду, как у закрытой отдельной сессии
+        session = self.session
+        session.expunge_all()
+        await session.rollback()
+
+
+_request_session: ContextVar[Optional[_RequestSession]] = ContextVar("request_session", default=None)
+
+
+@asynccontextmanager
+async def request_session_scope():
+    """
+    Одна лениво открываемая сессия на апдейт: все get_session() внутри неё
+    работают с одним соединением и общей identity map.
+    """
+    scope = _RequestSession()
+    token = _request_session.set(scope)
+    try:
+        yield scope
+    finally:
+        _request_session.reset(token)
+        scope.closed = True
+        if scope.session is not None:
+            await scope.session.close()
 
 
 @asynccontextmanager
 async def get_session():
     """
     Возвращает асинхронную сессию БД с автокоммитом/ролбэком.
+
+    Внутри request_session_scope отдаёт сессию апдейта: внешний блок в конце
+    всегда коммитит (или откатывает при ошибке) и отпускает соединение;
+    вложенные блоки ничего не завершают. Объекты остаются в identity map
+    (expire_on_commit=False), поэтому блокирующие SELECT ... FOR UPDATE
+    должны перечитывать строки через populate_existing.
     """
+    scope = _request_session.get()
+    if scope is not None and scope.usable():
+        session = scope.acquire()
+        scope.depth += 1
+        try:
+            yield session
+        except BaseException as e:
+            scope.depth -= 1
+            if scope.depth == 0 or isinstance(e, SQLAlchemyError):
+                await scope.rollback()
+            raise
+        scope.depth -= 1
+        if scope.depth == 0:
+            try:
+                await scope.commit()
+            except BaseException:
+                await scope.rollback()
+                raise
+        return
+
     session = AsyncSessionLocal()
     try:
         yield session
@@ -36,6 +120,46 @@ async def get_session():
         await session.close()
 
 
+async def resolve_user_id(session: AsyncSession, telegram_id: TelegramId) -> Optional[UserId]:
+    """
+    users.id по telegram_id: из кэша процесса, при промахе — один запрос по индексу.
+    """
+    user_id = user_ids.get(telegram_id)
+    if user_id is not None:
+        return user_id
+    found = await session.scalar(select(User.id).where(User.telegram_id == telegram_id))
+    if found is None:
+        return None
+    user_id = UserId(found)
+    user_ids.remember(telegram_id, user_id)
+    return user_id
+
+
+async def get_user_by_id(session: AsyncSession, user_id: UserId) -> Optional[User]:
+    """
+    Пользователь по первичному ключу; уже загруженный в сессию берётся из identity map.
+    """
+    return await session.get(User, user_id)
+
+
+async def get_user_by_telegram(session: AsyncSession, telegram_id: TelegramId) -> Optional[User]:
+    """
+    Пользователь по telegram_id. Если users.id известен кэшу, это поиск по
+    первичному ключу (или вовсе без запроса), иначе — один запрос по telegram_id.
+    """
+    user_id = user_ids.get(telegram_id)
+    if user_id is not None:
+        user = await session.get(User, user_id)
+        if user is not None and user.telegram_id == telegram_id:
+            return user
+        # Пользователь удалён и, возможно, зарегистрирован заново
+        user_ids.forget(telegram_id)
+    user = await session.scalar(select(User).where(User.telegram_id == telegram_id))
+    if user is not None:
+        user_ids.remember(telegram_id, UserId(user.id))
+    return user
+
+
 async def get_product_with_category(
     session: AsyncSession,
     product_id: int,
@@ -56,33 +180,14 @@ async def get_product_with_category(
     return product, category
 
 
-async def _resolve_user(session: AsyncSession, user_id_or_telegram: int) -> Optional[User]:
-    """
-    Возвращает пользователя по users.id или по users.telegram_id.
-    """
-    user = (
-        await session.execute(
-            select(User).where(User.id == user_id_or_telegram).limit(1)
-        )
-    ).scalar_one_or_none()
-    if user:
-        return user
-    user = (
-        await session.execute(
-            select(User).where(User.telegram_id == user_id_or_telegram).limit(1)
-        )
-    ).scalar_one_or_none()
-    return user
-
-
 async def get_user_with_family(
     session: AsyncSession,
-    user_id: int,
+    telegram_id: TelegramId,
 ) -> Tuple[User, Optional[Family], List[object]]:
     """
-    Возвращает пользователя и его семью по users.id или users.telegram_id.
+    Возвращает пользователя и его семью по users.telegram_id.
     """
-    user = await _resolve_user(session, user_id)
+    user = await get_user_by_telegram(session, telegram_id)
     if not user:
         raise ValueError("Пользователь не найден")
     family = None
@@ -126,13 +231,23 @@ async def deduct_family_points_proportional(
     Списывает баллы сначала с баланса семьи, затем пропорционально с балансов участников.
     """
     family = (
-        await session.execute(select(Family).where(Family.id == family_id).limit(1))
+        await session.execute(
+            select(Family)
+            .where(Family.id == family_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
     ).scalar_one_or_none()
     if not family:
         raise ValueError("Семья не найдена")
 
     members = (
-        await session.execute(select(User).where(User.family_id == family_id))
+        await session.execute(
+            select(User)
+            .where(User.family_id == family_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
     ).scalars().all()
 
     total_available = int(family.balance) + sum(int(u.balance) for u in members)
@@ -166,16 +281,16 @@ async def deduct_family_points_proportional(
 
 async def create_order_with_item(
     session: AsyncSession,
-    user_id: int,
+    user_id: UserId,
     product,
     pvz_id: str,
     recipient_first_name: str = "",
     recipient_last_name: str = "",
 ) -> Order:
     """
-    Создаёт заказ для реального users.id, найденного по id или telegram_id.
+    Создаёт заказ пользователя с данным users.id.
     """
-    user = await _resolve_user(session, user_id)
+    user = await get_user_by_id(session, user_id)
     if not user:
         raise ValueError("Пользователь не найден")
     order = Order(
@@ -3,6 +3,8 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
 
 from app.steps_bot.settings import config
+from app.steps_bot.middlewares.db_session import DbSessionMiddleware
+from app.steps_bot.middlewares.user_mailbox import UserMailboxMiddleware
 from app.steps_bot.handlers import start
 from app.steps_bot.handlers import back
 from app.steps_bot.handlers import walk
@@ -20,6 +22,7 @@ from app.steps_bot.handlers import promo
 from app.steps_bot.handlers import history
 from app.steps_bot.handlers import admin_tools
 from app.steps_bot.handlers import referral
+from app.steps_bot.handlers import chat_member
 
 bot = Bot(
     token=config.BOT_TOKEN,
@@ -27,6 +30,11 @@ bot = Bot(
 )
 dp = Dispatcher(storage=MemoryStorage())
 
+# одна сессия БД на апдейт, общая для хендлера и сервисов
+dp.update.outer_middleware(DbSessionMiddleware())
+# live-обновления геолокации одного пользователя обрабатываются последовательно
+dp.edited_message.outer_middleware(UserMailboxMiddleware())
+
 dp.include_router(start.router)
 dp.include_router(back.router)
 dp.include_router(walk.router)
@@ -43,4 +51,5 @@ dp.include_router(buy.router)
 dp.include_router(promo.router)
 dp.include_router(history.router)
 dp.include_router(referral.router)
-dp.include_router(admin_tools.router)
\ No newline at end of file
+dp.include_router(admin_tools.router)
+dp.include_router(chat_member.router)
\ No newline at end of file
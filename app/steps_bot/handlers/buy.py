@@ -292,7 +292,7 @@ async def on_full_name(message: Message, state: FSMContext) -> None:
     # Получаем телефон пользователя из профиля
     try:
         async with repo.get_session() as session:
-            user = await repo._resolve_user(session, message.from_user.id)
+            user = await repo.get_user_by_telegram(session, message.from_user.id)
             if not user or not user.phone:
                 await message.answer(
                     "Ошибка: телефон не найден в профиле. Пожалуйста, обновите профиль.",
@@ -0,0 +1,23 @@
+import logging
+
+from aiogram import Router, F
+from aiogram.enums import ChatType
+from aiogram.filters import ChatMemberUpdatedFilter, KICKED, MEMBER
+from aiogram.types import ChatMemberUpdated
+
+from app.steps_bot.services.unreachable_users import set_users_active
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+
+@router.my_chat_member(F.chat.type == ChatType.PRIVATE, ChatMemberUpdatedFilter(member_status_changed=KICKED))
+async def bot_blocked(event: ChatMemberUpdated) -> None:
+    """Пользователь заблокировал бота — убираем его из рассылок."""
+    await set_users_active([event.from_user.id], False)
+
+
+@router.my_chat_member(F.chat.type == ChatType.PRIVATE, ChatMemberUpdatedFilter(member_status_changed=MEMBER))
+async def bot_unblocked(event: ChatMemberUpdated) -> None:
+    """Пользователь разблокировал бота — снова включаем его в рассылки."""
+    await set_users_active([event.from_user.id], True)
@@ -1,7 +1,5 @@
 import contextlib
 import logging
-import time
-import datetime as dt
 
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
@@ -16,19 +14,8 @@ from app.steps_bot.presentation.keyboards.simple_kb import (
 from app.steps_bot.services.coefficients_service import get_total_multiplier
 from app.steps_bot.services.weather_service import get_current_temp_c
 from app.steps_bot.states.walk import WalkStates
-from app.steps_bot.storage.user_memory import (
-    user_coords,
-    user_steps,
-    user_msg_id,
-    user_walk_finished,
-    user_walk_multiplier,
-    user_walk_form,
-    user_walk_started_at,
-    user_temp_c,
-    user_temp_updated_at,
-    user_daily_steps_used,
-    user_daily_steps_date,
-)
+from app.steps_bot.storage.user_memory import walk_registry
+from app.steps_bot.services.daily_steps_service import get_used_steps
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -77,46 +64,37 @@ async def process_dog_walk_location(
     location = message.location
     user_id = message.from_user.id
 
-    user_walk_finished.pop(user_id, None)
-
     # Определяем оставшийся дневной лимит
-    today = dt.date.today().isoformat()
-    if user_daily_steps_date.get(user_id) != today:
-        user_daily_steps_date[user_id] = today
-        user_daily_steps_used[user_id] = 0
-    remaining = max(0, DEFAULT_STEP_GOAL - int(user_daily_steps_used.get(user_id, 0)))
+    remaining = max(0, DEFAULT_STEP_GOAL - await get_used_steps(user_id))
 
     if remaining <= 0:
-        await callback.message.delete()
-        await callback.message.answer(
+        await message.answer(
             "🏁 Дневной лимит шагов уже достигнут. Возвращайтесь завтра!",
             reply_markup=walk_back_kb,
         )
-        await callback.answer()
+        await state.clear()
         return
 
-    await state.update_data(step_goal=remaining)
-
     if not location.live_period:
         await message.answer("❌ Пожалуйста, отправь именно лайв-локацию через 📎")
         return
 
-    user_coords.pop(user_id, None)
-    user_steps.pop(user_id, None)
-    user_msg_id.pop(user_id, None)
-
     current_coords = (location.latitude, location.longitude)
-    user_coords[user_id] = (current_coords, time.time())
-    user_steps[user_id] = 0
+    session = walk_registry.start(
+        user_id,
+        chat_id=message.chat.id,
+        coords=current_coords,
+        form=WalkForm.DOG,
+        step_goal=remaining,
+    )
+    session.live_until = session.started_at + location.live_period
 
     temp_c = await get_current_temp_c(current_coords[0], current_coords[1])
-    user_temp_c[user_id] = temp_c
-    user_temp_updated_at[user_id] = time.time()
+    session.temp_c = temp_c
+    session.temp_updated_at = session.started_at
 
-    user_walk_form[user_id] = WalkForm.DOG
     multiplier = await get_total_multiplier(WalkForm.DOG, temp_c=temp_c)
-    user_walk_multiplier[user_id] = multiplier
-    user_walk_started_at[user_id] = time.time()
+    session.multiplier = multiplier
 
     temp_str = (
         f"{'+' if (temp_c is not None and temp_c >= 0) else ''}{temp_c}°C"
@@ -130,7 +108,8 @@ async def process_dog_walk_location(
         f"⭐ Баллы: 0 (коэфф: ×{multiplier})",
         reply_markup=end_walk_kb,
     )
-    user_msg_id[user_id] = {"chat_id": message.chat.id, "message_id": sent.message_id}
+    session.message_id = sent.message_id
+    walk_registry.touch(session)
     logger.info(
         "Начало прогулки пользователя %s: message_id=%s; temp=%s; mul=%s",
         user_id,
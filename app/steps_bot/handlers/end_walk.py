@@ -9,9 +9,12 @@ router = Router()
 @router.callback_query(F.data == "end_walk")
 async def end_dog_walk(callback: CallbackQuery) -> None:
     """Завершает прогулку по кнопке и редактирует это же сообщение."""
-    await finish_walk(
+    finished = await finish_walk(
         callback.message,
         target_message_id=callback.message.message_id,
         user_id=callback.from_user.id,
     )
+    if not finished:
+        await callback.answer("Прогулка уже завершена")
+        return
     await callback.answer()
@@ -20,7 +20,7 @@ async def show_history(callback: CallbackQuery) -> None:
     async with get_session() as session:
         user, family, entries = await get_history_for_user_with_family(
             session=session,
-            user_id_or_telegram=user_id,
+            telegram_id=user_id,
             limit=20,
         )
 
@@ -6,6 +6,14 @@ from contextlib import asynccontextmanager
 from app.steps_bot.dispatcher import bot
 from app.steps_bot.settings import config
 from app.steps_bot.presentation.commands import set_default_commands
+from app.steps_bot.services.captions_service import content_cache
+from app.steps_bot.services.coefficients_service import coefficients
+from app.steps_bot.services.invalidation_bus import invalidation_bus
+from app.steps_bot.services.media_warmup import schedule_media_warmup
+from app.steps_bot.services.settings_service import SettingsService
+from app.steps_bot.services.walk_tasks import start_walk_tasks, stop_walk_tasks
+from app.steps_bot.services.weather_service import weather_service
+from app.steps_bot.storage.user_memory import walk_registry
 from app.steps_bot.webhooks import telegram_webhook
 
 logging.basicConfig(
@@ -25,8 +33,21 @@ async def lifespan(app: FastAPI):
         await set_default_commands(bot)
     except Exception as e:
         logger.error(f"Failed to set webhook: {e}")
+    await walk_registry.open()
+    await weather_service.open()
+    await coefficients.open()
+    await invalidation_bus.open()
+    await SettingsService.open()
+    schedule_media_warmup(bot)
+    walk_tasks = start_walk_tasks(bot)
     yield
     logger.info("Shutting down...")
+    await stop_walk_tasks(walk_tasks)
+    await walk_registry.close()
+    await weather_service.close()
+    await coefficients.close()
+    await invalidation_bus.close()
+    await content_cache.close()
     try:
         await bot.delete_webhook()
     except Exception as e:
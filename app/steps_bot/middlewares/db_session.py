@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.steps_bot.db.repo import request_session_scope
+
+Handler = Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Открывает на время апдейта общую сессию БД. Соединение берётся из пула
+    только при первом обращении, так что апдейты без БД его не занимают.
+    Хендлеры и сервисы получают сессию через обычный get_session().
+    """
+
+    async def __call__(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        async with request_session_scope():
+            return await handler(event, data)
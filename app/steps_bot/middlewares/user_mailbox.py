@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Message, TelegramObject
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+MAILBOX_MAX_DEPTH = 4
+
+
+class _Envelope:
+    __slots__ = ("handler", "event", "data", "future", "is_location")
+
+    def __init__(
+        self,
+        handler: Handler,
+        event: TelegramObject,
+        data: Dict[str, Any],
+        future: asyncio.Future,
+        is_location: bool,
+    ) -> None:
+        self.handler = handler
+        self.event = event
+        self.data = data
+        self.future = future
+        self.is_location = is_location
+
+
+class _Mailbox:
+    __slots__ = ("queue", "busy")
+
+    def __init__(self) -> None:
+        self.queue: Deque[_Envelope] = deque()
+        self.busy = False
+
+
+class UserMailboxMiddleware(BaseMiddleware):
+    """
+    Обрабатывает события одного пользователя строго по очереди, а разных
+    пользователей — параллельно. Очередь ограничена max_depth; если в ней уже
+    ждёт точка геолокации, она вытесняется более свежей.
+    """
+
+    def __init__(self, max_depth: int = MAILBOX_MAX_DEPTH) -> None:
+        self.max_depth = max_depth
+        self._boxes: Dict[int, _Mailbox] = {}
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._boxes)
+
+    async def __call__(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        box = self._boxes.get(user.id)
+        if box is None:
+            box = self._boxes[user.id] = _Mailbox()
+
+        if not box.busy:
+            box.busy = True
+            try:
+                return await handler(event, data)
+            finally:
+                self._after_run(user.id, box)
+
+        is_location = isinstance(event, Message) and event.location is not None
+        if is_location:
+            for queued in [e for e in box.queue if e.is_location]:
+                box.queue.remove(queued)
+                self._drop(queued)
+        if len(box.queue) >= self.max_depth:
+            self._drop(box.queue.popleft())
+            logger.warning("mailbox overflow for user %s", user.id)
+
+        future = asyncio.get_running_loop().create_future()
+        box.queue.append(_Envelope(handler, event, data, future, is_location))
+        return await future
+
+    def _drop(self, envelope: _Envelope) -> None:
+        self.dropped += 1
+        if not envelope.future.done():
+            envelope.future.set_result(None)
+
+    def _after_run(self, user_id: int, box: _Mailbox) -> None:
+        if box.queue:
+            asyncio.create_task(self._drain(user_id, box))
+            return
+        box.busy = False
+        self._boxes.pop(user_id, None)
+
+    async def _drain(self, user_id: int, box: _Mailbox) -> None:
+        try:
+            while box.queue:
+                envelope = box.queue.popleft()
+                if envelope.future.done():
+                    continue
+                try:
+                    result = await envelope.handler(envelope.event, envelope.data)
+                except Exception as e:
+                    if not envelope.future.done():
+                        envelope.future.set_exception(e)
+                else:
+                    if not envelope.future.done():
+                        envelope.future.set_result(result)
+        finally:
+            while box.queue:
+                self._drop(box.queue.popleft())
+            box.busy = False
+            self._boxes.pop(user_id, None)
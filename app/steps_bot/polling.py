@@ -2,7 +2,15 @@ import asyncio
 import logging
 
 from app.steps_bot.dispatcher import dp, bot
-from app.steps_bot.services.broadcast_service import run_broadcast_worker_once
+from app.steps_bot.services.broadcast_service import run_broadcast_scheduler
+from app.steps_bot.services.captions_service import content_cache
+from app.steps_bot.services.coefficients_service import coefficients
+from app.steps_bot.services.invalidation_bus import invalidation_bus
+from app.steps_bot.services.media_warmup import schedule_media_warmup
+from app.steps_bot.services.settings_service import SettingsService
+from app.steps_bot.services.walk_tasks import start_walk_tasks, stop_walk_tasks
+from app.steps_bot.services.weather_service import weather_service
+from app.steps_bot.storage.user_memory import walk_registry
 
 
 async def _main() -> None:
@@ -16,18 +24,27 @@ async def _main() -> None:
     except Exception as e:
         logging.warning("delete_webhook failed: %s", e)
 
-    async def scheduler():
-        while True:
-            try:
-                await run_broadcast_worker_once()
-            except Exception as e:
-                logging.error("broadcast worker error: %s", e)
-            await asyncio.sleep(60)
-
-    await asyncio.gather(
-        dp.start_polling(bot),
-        scheduler(),
-    )
+    # Хранилище прогулок: незавершённые подхватываются по первому обновлению или автозавершением
+    await walk_registry.open()
+    await weather_service.open()
+    await coefficients.open()
+    await invalidation_bus.open()
+    await SettingsService.open()
+    schedule_media_warmup(bot)
+    walk_tasks = start_walk_tasks(bot)
+
+    try:
+        await asyncio.gather(
+            dp.start_polling(bot),
+            run_broadcast_scheduler(),
+        )
+    finally:
+        await stop_walk_tasks(walk_tasks)
+        await walk_registry.close()
+        await weather_service.close()
+        await coefficients.close()
+        await invalidation_bus.close()
+        await content_cache.close()
 
 
 if __name__ == "__main__":
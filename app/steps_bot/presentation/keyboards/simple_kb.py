@@ -4,8 +4,17 @@ from app.steps_bot.services.settings_service import SettingsService
 from app.steps_bot.settings import config
 
 # Главное меню
+DEFAULT_SUPPORT_URL = 'https://t.me/bottecp'
+
+# (url поддержки, клавиатура): клавиатура пересобирается только при смене url
+_main_menu_cache: tuple[str, InlineKeyboardMarkup] | None = None
+
+
 async def main_menu_kb() -> InlineKeyboardMarkup:
-    support_url = await SettingsService.get_setting('поддержка')
+    global _main_menu_cache
+    support_url = await SettingsService.get_setting('поддержка') or DEFAULT_SUPPORT_URL
+    if _main_menu_cache is not None and _main_menu_cache[0] == support_url:
+        return _main_menu_cache[1]
 
     keyboard = InlineKeyboardMarkup(
         inline_keyboard=[
@@ -17,10 +26,11 @@ async def main_menu_kb() -> InlineKeyboardMarkup:
             [InlineKeyboardButton(text='❓ FAQ', callback_data='faq')],
             [InlineKeyboardButton(
                 text='🛠️ Техническая поддержка',
-                url=support_url if support_url else 'https://t.me/bottecp'
+                url=support_url
             )]
         ]
     )
+    _main_menu_cache = (support_url, keyboard)
     return keyboard
 
 
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterable, Awaitable, Callable, Dict, Iterable, Optional, Union
+
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Сколько раз повторять отправку одному получателю после TelegramRetryAfter
+MAX_RETRIES = 3
+# Как часто писать прогресс в лог
+PROGRESS_INTERVAL_SECONDS = 10.0
+# Не чаще одного сообщения в один чат за указанное время
+PER_CHAT_INTERVAL_SECONDS = 1.0
+
+
+class TokenBucket:
+    """
+    Глобальный лимит скорости: rate токенов в секунду, запас до capacity.
+    pause() останавливает выдачу токенов целиком (ответ RetryAfter касается всего бота).
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class ChatLimiter:
+    """
+    Минимальный интервал между сообщениями в один чат.
+
+    Истёкшие записи раз в interval выбрасываются, поэтому словарь хранит
+    только чаты последних секунд, а не всю аудиторию рассылки.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._next_at: Dict[int, float] = {}
+        self._pruned_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._next_at)
+
+    async def wait(self, chat_id: int) -> None:
+        now = time.monotonic()
+        if now - self._pruned_at >= self.interval:
+            self._next_at = {cid: at for cid, at in self._next_at.items() if at > now}
+            self._pruned_at = now
+        next_at = self._next_at.get(chat_id, 0.0)
+        self._next_at[chat_id] = max(now, next_at) + self.interval
+        if next_at > now:
+            await asyncio.sleep(next_at - now)
+
+
+class BroadcastProgress:
+    __slots__ = ("total", "sent", "failed", "retried", "started_at")
+
+    def __init__(self, total: int = 0) -> None:
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.started_at = time.monotonic()
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.total - self.sent - self.failed)
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return (self.sent + self.failed) / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "remaining": self.remaining,
+            "retried": self.retried,
+            "per_second": round(self.rate, 1),
+        }
+
+
+class BroadcastEngine:
+    """
+    Рассылает сообщения пулом воркеров. Темп задаёт общий TokenBucket
+    (~30 сообщений в секунду на бота) и ChatLimiter; на TelegramRetryAfter
+    весь пул ставится на паузу, а воркер повторяет отправку тому же получателю.
+
+    Получатели читаются из (асинхронного) итератора в очередь ограниченного
+    размера, поэтому память не зависит от числа получателей.
+    """
+
+    def __init__(self, rate: float, workers: int, queue_size: int = 1000) -> None:
+        self.bucket = TokenBucket(rate)
+        self.chats = ChatLimiter(PER_CHAT_INTERVAL_SECONDS)
+        self.workers = workers
+        self.queue_size = queue_size
+
+    async def run(
+        self,
+        recipients: Union[Iterable[int], AsyncIterable[int]],
+        send: Callable[[int], Awaitable[Any]],
+        label: str = "broadcast",
+    ) -> BroadcastProgress:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        progress = BroadcastProgress()
+
+        async def produce() -> None:
+            if hasattr(recipients, "__aiter__"):
+                async for chat_id in recipients:
+                    progress.total += 1
+                    await queue.put(chat_id)
+            else:
+                for chat_id in recipients:
+                    progress.total += 1
+                    await queue.put(chat_id)
+
+        async def deliver(chat_id: int) -> None:
+            attempt = 0
+            while True:
+                await self.chats.wait(chat_id)
+                await self.bucket.acquire()
+                try:
+                    await send(chat_id)
+                    return
+                except TelegramRetryAfter as e:
+                    self.bucket.pause(e.retry_after)
+                    if attempt >= MAX_RETRIES:
+                        raise
+                    attempt += 1
+                    progress.retried += 1
+
+        async def worker() -> None:
+            while True:
+                chat_id = await queue.get()
+                try:
+                    await deliver(chat_id)
+                    progress.sent += 1
+                except Exception as e:
+                    progress.failed += 1
+                    logger.debug("%s: send to %s failed: %s", label, chat_id, e)
+                finally:
+                    queue.task_done()
+
+        async def reporter() -> None:
+            while True:
+                await asyncio.sleep(PROGRESS_INTERVAL_SECONDS)
+                logger.info("%s progress: %s", label, progress.as_dict())
+
+        tasks = [asyncio.create_task(worker()) for _ in range(max(1, self.workers))]
+        tasks.append(asyncio.create_task(reporter()))
+        try:
+            await produce()
+            await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info("%s finished: %s", label, progress.as_dict())
+        return progress
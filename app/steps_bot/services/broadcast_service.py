@@ -1,73 +1,527 @@
 import asyncio
-from typing import Optional
+import datetime as dt
+import hashlib
+import logging
+import socket
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
 import os
 
-from sqlalchemy import select, func
+from sqlalchemy import literal, select, func, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from app.steps_bot.db.repo import get_session
-from app.steps_bot.db.models import User, Broadcast, BroadcastStatus, MediaType
+from app.steps_bot.db.models import User, Broadcast, BroadcastDelivery, BroadcastStatus, MediaType
 from app.steps_bot.dispatcher import bot
+from app.steps_bot.services.broadcast_engine import BroadcastEngine
+from app.steps_bot.services.invalidation_bus import invalidation_bus
+from app.steps_bot.services.segments import recipients_query
+from app.steps_bot.services.unreachable_users import UnreachableUsers
 from app.steps_bot.settings import config
-from aiogram.types import FSInputFile
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import FSInputFile, Message
 
+logger = logging.getLogger(__name__)
 
-async def list_recipients(session) -> list[int]:
-    result = await session.execute(select(User.telegram_id))
-    return [row[0] for row in result.all()]
+# После стольких неудачных попыток (RetryAfter, рестарт) доставка считается проваленной
+MAX_DELIVERY_ATTEMPTS = 3
+# Страховочный опрос на случай потерянного уведомления
+BROADCAST_IDLE_WAKEUP_SECONDS = 5 * 60
+BROADCAST_ERROR_RETRY_SECONDS = 30.0
 
+# Идентификатор этого процесса в broadcasts.claimed_by
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"[:64]
 
-async def send_broadcast_now(b: Broadcast) -> None:
+
+def _media_path(b: Broadcast) -> Optional[str]:
+    path = b.media_file
+    if path and not os.path.isabs(path):
+        path = os.path.join(config.MEDIA_ROOT, path)
+    if path and os.path.exists(path):
+        return path
+    return None
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+async def _send(chat_id: int, b: Broadcast, media: Any) -> Message:
+    """
+    Отправляет рассылку одному получателю; media — file_id, FSInputFile, URL или None.
+    """
+    if media is not None and b.media_type == MediaType.PHOTO:
+        return await bot.send_photo(chat_id, media, caption=b.text or "")
+    if media is not None and b.media_type == MediaType.VIDEO:
+        return await bot.send_video(chat_id, media, caption=b.text or "")
+    return await bot.send_message(chat_id, b.text or "")
+
+
+def _sent_file_id(b: Broadcast, sent: Message) -> Optional[str]:
+    if b.media_type == MediaType.PHOTO and sent.photo:
+        return sent.photo[-1].file_id
+    if b.media_type == MediaType.VIDEO and sent.video:
+        return sent.video.file_id
+    return None
+
+
+async def _save_media(b: Broadcast, file_id: str, media_hash: Optional[str]) -> None:
+    b.telegram_file_id = file_id
+    b.media_hash = media_hash
     async with get_session() as session:
-        user_ids = await list_recipients(session)
-    for uid in user_ids:
+        await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == b.id)
+            .values(telegram_file_id=file_id, media_hash=media_hash)
+        )
+
+
+async def prepare_broadcast_media(b: Broadcast) -> Tuple[Any, Optional[str]]:
+    """
+    Подбирает источник медиа для рассылки: готовый file_id, file_id другой
+    рассылки с тем же файлом (по sha256) или исходник для единственной загрузки.
+    Возвращает (источник, хэш файла). Если задан MEDIA_STORAGE_CHAT_ID, исходник
+    сразу загружается туда и возвращается уже file_id.
+    """
+    if b.media_type not in (MediaType.PHOTO, MediaType.VIDEO):
+        return None, None
+    if b.telegram_file_id:
+        return b.telegram_file_id, b.media_hash
+
+    media_hash = None
+    path = _media_path(b)
+    if path:
+        media_hash = await asyncio.to_thread(_file_sha256, path)
+        async with get_session() as session:
+            known = await session.scalar(
+                select(Broadcast.telegram_file_id)
+                .where(
+                    Broadcast.media_hash == media_hash,
+                    Broadcast.media_type == b.media_type,
+                    Broadcast.telegram_file_id.is_not(None),
+                )
+                .limit(1)
+            )
+        if known:
+            await _save_media(b, known, media_hash)
+            return known, media_hash
+        source: Any = FSInputFile(path)
+    elif b.media_url:
+        source = b.media_url
+    else:
+        return None, None
+
+    if config.MEDIA_STORAGE_CHAT_ID:
+        try:
+            sent = await _send(config.MEDIA_STORAGE_CHAT_ID, b, source)
+            file_id = _sent_file_id(b, sent)
+            if file_id:
+                await _save_media(b, file_id, media_hash)
+                return file_id, media_hash
+        except Exception as e:
+            logger.warning("broadcast %s: staging upload failed: %s", b.id, e)
+    return source, media_hash
+
+
+async def _enqueue_deliveries(b: Broadcast) -> int:
+    """
+    Один раз на рассылку создаёт строки доставки для активных пользователей её
+    сегмента одним INSERT ... SELECT на стороне БД. При повторном запуске ничего не делает.
+    """
+    async with get_session() as session:
+        exists = await session.scalar(
+            select(BroadcastDelivery.id).where(BroadcastDelivery.broadcast_id == b.id).limit(1)
+        )
+        if exists:
+            return 0
+        stmt = (
+            pg_insert(BroadcastDelivery)
+            .from_select(
+                ["user_id", "broadcast_id"],
+                recipients_query(b.segment).add_columns(literal(b.id)),
+            )
+            .on_conflict_do_nothing(index_elements=["broadcast_id", "user_id"])
+        )
+        result = await session.execute(stmt)
+        return result.rowcount or 0
+
+
+async def _claim_deliveries(
+    broadcast_id: int,
+    after_user_id: int,
+    limit: int,
+) -> List[Tuple[int, int, int]]:
+    """
+    Берёт следующую пачку ожидающих доставок после after_user_id (keyset по
+    users.id), пропуская ставших неактивными пользователей, и увеличивает им
+    счётчик попыток. Возвращает тройки (id доставки, users.id, telegram_id).
+    """
+    async with get_session() as session:
+        rows = (await session.execute(
+            select(BroadcastDelivery.id, BroadcastDelivery.user_id, User.telegram_id)
+            .join(User, User.id == BroadcastDelivery.user_id)
+            .where(
+                BroadcastDelivery.broadcast_id == broadcast_id,
+                BroadcastDelivery.status == BroadcastStatus.PENDING,
+                BroadcastDelivery.user_id > after_user_id,
+                BroadcastDelivery.attempts < MAX_DELIVERY_ATTEMPTS,
+                User.is_active.is_(True),
+            )
+            .order_by(BroadcastDelivery.user_id)
+            .limit(limit)
+        )).all()
+        if rows:
+            await session.execute(
+                update(BroadcastDelivery)
+                .where(BroadcastDelivery.id.in_([r[0] for r in rows]))
+                .values(attempts=BroadcastDelivery.attempts + 1)
+            )
+    return [(r[0], r[1], r[2]) for r in rows]
+
+
+async def iter_pending_deliveries(
+    broadcast_id: int,
+    chunk_size: int,
+    before_claim: Optional[Callable[[], Awaitable[None]]] = None,
+) -> AsyncIterator[Tuple[int, int]]:
+    """
+    Поток ожидающих доставок (id доставки, telegram_id) пачками фиксированного
+    размера; в памяти одновременно не больше одной пачки. before_claim
+    вызывается перед захватом каждой пачки.
+    """
+    after = 0
+    while True:
+        if before_claim is not None:
+            await before_claim()
+        chunk = await _claim_deliveries(broadcast_id, after, chunk_size)
+        if not chunk:
+            return
+        after = chunk[-1][1]
+        for delivery_id, _user_id, telegram_id in chunk:
+            yield delivery_id, telegram_id
+
+
+async def _record_deliveries(sent_ids: List[int], failed: Dict[int, str]) -> None:
+    async with get_session() as session:
+        if sent_ids:
+            await session.execute(
+                update(BroadcastDelivery)
+                .where(BroadcastDelivery.id.in_(sent_ids))
+                .values(status=BroadcastStatus.SENT, sent_at=func.now(), error=None)
+            )
+        if failed:
+            await session.execute(
+                update(BroadcastDelivery),
+                [
+                    {"id": did, "status": BroadcastStatus.FAILED, "error": error[:255]}
+                    for did, error in failed.items()
+                ],
+            )
+
+
+async def _fail_exhausted(broadcast_id: int) -> None:
+    async with get_session() as session:
+        await session.execute(
+            update(BroadcastDelivery)
+            .where(
+                BroadcastDelivery.broadcast_id == broadcast_id,
+                BroadcastDelivery.status == BroadcastStatus.PENDING,
+                BroadcastDelivery.attempts >= MAX_DELIVERY_ATTEMPTS,
+            )
+            .values(status=BroadcastStatus.FAILED, error="retry limit exceeded")
+        )
+
+
+async def delivery_counts(broadcast_id: int) -> Dict[str, int]:
+    async with get_session() as session:
+        rows = (await session.execute(
+            select(BroadcastDelivery.status, func.count())
+            .where(BroadcastDelivery.broadcast_id == broadcast_id)
+            .group_by(BroadcastDelivery.status)
+        )).all()
+    return {status.value: count for status, count in rows}
+
+
+async def send_broadcast_now(b: Broadcast) -> Dict[str, int]:
+    """
+    Доставляет рассылку по журналу broadcast_deliveries. Получатели читаются
+    пачками прямо в пул отправки, результаты пишутся пачками по мере доставки,
+    поэтому после рестарта рассылка продолжается с неподтверждённых доставок.
+    """
+    await _enqueue_deliveries(b)
+    media, media_hash = await prepare_broadcast_media(b)
+    engine = BroadcastEngine(
+        rate=config.BROADCAST_RATE_PER_SECOND,
+        workers=config.BROADCAST_WORKERS,
+        queue_size=config.BROADCAST_CHUNK_SIZE,
+    )
+    capture_lock = asyncio.Lock()
+    delivery_by_chat: Dict[int, int] = {}
+    sent_ids: List[int] = []
+    failed: Dict[int, str] = {}
+    flush_due = asyncio.Event()
+
+    unreachable = UnreachableUsers()
+
+    async def flush() -> None:
+        nonlocal sent_ids, failed
+        if not sent_ids and not failed:
+            return
+        batch_sent, batch_failed = sent_ids, failed
+        sent_ids, failed = [], {}
         try:
-            if b.media_type == MediaType.PHOTO:
-                # порядок: file_id -> локальный файл -> URL -> текст
-                if b.telegram_file_id:
-                    await bot.send_photo(uid, b.telegram_file_id, caption=b.text or "")
-                else:
-                    path = b.media_file
-                    if path and not os.path.isabs(path):
-                        path = os.path.join(config.MEDIA_ROOT, path)
-                    if path and os.path.exists(path):
-                        await bot.send_photo(uid, FSInputFile(path), caption=b.text or "")
-                    elif b.media_url:
-                        await bot.send_photo(uid, b.media_url, caption=b.text or "")
-                    else:
-                        await bot.send_message(uid, b.text or "")
-            elif b.media_type == MediaType.VIDEO:
-                if b.telegram_file_id:
-                    await bot.send_video(uid, b.telegram_file_id, caption=b.text or "")
-                else:
-                    path = b.media_file
-                    if path and not os.path.isabs(path):
-                        path = os.path.join(config.MEDIA_ROOT, path)
-                    if path and os.path.exists(path):
-                        await bot.send_video(uid, FSInputFile(path), caption=b.text or "")
-                    elif b.media_url:
-                        await bot.send_video(uid, b.media_url, caption=b.text or "")
-                    else:
-                        await bot.send_message(uid, b.text or "")
+            await _record_deliveries(batch_sent, batch_failed)
+        except BaseException:
+            # Возвращаем пачку: незаписанные доставки остались бы pending и ушли повторно
+            sent_ids = batch_sent + sent_ids
+            for did, error in batch_failed.items():
+                failed.setdefault(did, error)
+            raise
+        await unreachable.flush()
+
+    async def flush_quietly() -> None:
+        # Пачку, которую не удалось записать, запишет следующая попытка
+        try:
+            await flush()
+        except Exception as e:
+            logger.warning("broadcast %s: failed to record deliveries: %s", b.id, e)
+
+    async def flusher() -> None:
+        # Записывает результаты вне воркеров: ошибка записи не делает
+        # удачную отправку неудачной и не задерживает следующую
+        while True:
+            await flush_due.wait()
+            flush_due.clear()
+            await flush_quietly()
+
+    def needs_upload() -> bool:
+        return media is not None and media != b.telegram_file_id
+
+    async def deliver(tid: int) -> None:
+        nonlocal media
+        did = delivery_by_chat.pop(tid)
+        try:
+            if needs_upload():
+                # Первая удачная отправка загружает файл, остальные ждут её file_id
+                async with capture_lock:
+                    if needs_upload():
+                        sent = await _send(tid, b, media)
+                        file_id = _sent_file_id(b, sent)
+                        if file_id:
+                            media = file_id
+                            try:
+                                await _save_media(b, file_id, media_hash)
+                            except Exception as e:
+                                logger.warning("broadcast %s: failed to store file_id: %s", b.id, e)
+                                b.telegram_file_id = file_id
+                        sent_ids.append(did)
+                        return
+            await _send(tid, b, media)
+        except TelegramRetryAfter:
+            delivery_by_chat[tid] = did
+            raise
+        except Exception as e:
+            if unreachable.check(tid, e):
+                failed[did] = f"unreachable: {e}"
             else:
-                await bot.send_message(uid, b.text or "")
-        except Exception:
-            continue
+                failed[did] = str(e)
+            raise
+        sent_ids.append(did)
+        if len(sent_ids) + len(failed) >= config.BROADCAST_CHUNK_SIZE:
+            flush_due.set()
+
+    async def recipients() -> AsyncIterator[int]:
+        # Статусы уже отправленного записываются до захвата следующей пачки
+        # и при каждом BROADCAST_CHUNK_SIZE результатах. После падения повторно
+        # уходят только отправленные, но не записанные: меньше одной пачки плюс
+        # сообщения, которые воркеры отправляли в этот момент. Захваченные, но
+        # не отправленные доставки остаются pending и просто отправятся позже.
+        async for did, tid in iter_pending_deliveries(b.id, config.BROADCAST_CHUNK_SIZE, before_claim=flush_quietly):
+            delivery_by_chat[tid] = did
+            yield tid
+
+    # Повторные проходы подбирают доставки, оставшиеся в очереди (RetryAfter);
+    # счётчик попыток гарантирует, что проходы закончатся.
+    flush_task = asyncio.create_task(flusher())
+    try:
+        while True:
+            try:
+                progress = await engine.run(recipients(), deliver, label=f"broadcast {b.id}")
+            finally:
+                await flush()
+            delivery_by_chat.clear()
+            if not progress.total:
+                break
+    finally:
+        flush_task.cancel()
+        await asyncio.gather(flush_task, return_exceptions=True)
+        await flush()
+
+    await _fail_exhausted(b.id)
+    counts = await delivery_counts(b.id)
+    counts["unreachable"] = unreachable.seen
+    logger.info(
+        "broadcast %s delivered: %s, deactivated %s unreachable users",
+        b.id,
+        counts,
+        unreachable.deactivated,
+    )
+    return counts
+
+
+def _due_condition():
+    """
+    Рассылка готова к отправке: ожидает и время наступило, либо её захват истёк
+    (воркер упал или потерял соединение) — тогда она продолжается по журналу доставок.
+    """
+    pending_due = (Broadcast.status == BroadcastStatus.PENDING) & (
+        Broadcast.scheduled_at.is_(None) | (Broadcast.scheduled_at <= func.now())
+    )
+    lease_expired = (Broadcast.status == BroadcastStatus.IN_PROGRESS) & (
+        Broadcast.lease_until.is_(None) | (Broadcast.lease_until < func.now())
+    )
+    return pending_due | lease_expired
 
 
 async def pick_due_broadcast() -> Optional[Broadcast]:
+    """
+    Атомарно захватывает одну готовую рассылку (FOR UPDATE SKIP LOCKED),
+    переводит её в IN_PROGRESS и выставляет аренду на BROADCAST_LEASE_SECONDS.
+    Несколько реплик бота никогда не возьмут одну рассылку одновременно.
+    """
+    candidate = (
+        select(Broadcast.id)
+        .where(_due_condition())
+        .order_by(Broadcast.scheduled_at.is_(None).desc(), Broadcast.scheduled_at.asc(), Broadcast.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
     async with get_session() as session:
-        q = select(Broadcast).where(Broadcast.status == BroadcastStatus.PENDING)
-        # Если указано время — отправлять, когда наступило
-        q = q.where((Broadcast.scheduled_at.is_(None)) | (Broadcast.scheduled_at <= func.now()))
-        row = await session.execute(q.order_by(Broadcast.scheduled_at.is_(None).desc(), Broadcast.scheduled_at.asc()).limit(1))
+        row = await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == candidate)
+            .values(
+                status=BroadcastStatus.IN_PROGRESS,
+                claimed_by=WORKER_ID,
+                lease_until=func.now() + _lease_interval(),
+            )
+            .returning(Broadcast)
+            .execution_options(synchronize_session=False)
+        )
         return row.scalar_one_or_none()
 
 
-async def run_broadcast_worker_once() -> None:
+def _lease_interval():
+    return dt.timedelta(seconds=config.BROADCAST_LEASE_SECONDS)
+
+
+async def _extend_lease(broadcast_id: int) -> bool:
+    async with get_session() as session:
+        result = await session.execute(
+            update(Broadcast)
+            .where(
+                Broadcast.id == broadcast_id,
+                Broadcast.status == BroadcastStatus.IN_PROGRESS,
+                Broadcast.claimed_by == WORKER_ID,
+            )
+            .values(lease_until=func.now() + _lease_interval())
+        )
+        return bool(result.rowcount)
+
+
+async def _heartbeat(broadcast_id: int, sending: asyncio.Task) -> None:
+    """
+    Продлевает аренду, пока идёт отправка. Если рассылку перехватили
+    (аренда истекла), отправка останавливается.
+    """
+    while True:
+        await asyncio.sleep(config.BROADCAST_LEASE_SECONDS / 3)
+        try:
+            still_ours = await _extend_lease(broadcast_id)
+        except Exception as e:
+            logger.warning("broadcast %s: lease heartbeat failed: %s", broadcast_id, e)
+            continue
+        if not still_ours:
+            logger.warning("broadcast %s: lease lost, stopping", broadcast_id)
+            sending.cancel()
+            return
+
+
+async def run_broadcast_worker_once() -> bool:
+    """
+    Захватывает и отправляет одну рассылку. Возвращает False, если готовых нет.
+    """
     b = await pick_due_broadcast()
     if not b:
-        return
-    await send_broadcast_now(b)
+        return False
+
+    sending = asyncio.create_task(send_broadcast_now(b))
+    heartbeat = asyncio.create_task(_heartbeat(b.id, sending))
+    try:
+        await sending
+    except asyncio.CancelledError:
+        # Отправку остановил heartbeat (аренду перехватили) — это не остановка бота
+        if heartbeat.done() and not heartbeat.cancelled():
+            return True
+        raise
+    finally:
+        heartbeat.cancel()
+
+    async with get_session() as session:
+        await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == b.id, Broadcast.claimed_by == WORKER_ID)
+            .values(status=BroadcastStatus.SENT, sent_at=func.now(), lease_until=None)
+        )
+    return True
+
+
+async def seconds_until_next_broadcast() -> Optional[float]:
+    """
+    Через сколько секунд станет готова ближайшая рассылка (по scheduled_at или
+    истечению чужой аренды). None — ждать нечего.
+    """
+    next_at = func.least(
+        func.min(Broadcast.scheduled_at).filter(Broadcast.status == BroadcastStatus.PENDING),
+        func.min(Broadcast.lease_until).filter(Broadcast.status == BroadcastStatus.IN_PROGRESS),
+    )
     async with get_session() as session:
-        db_b = await session.get(Broadcast, b.id)
-        if db_b:
-            db_b.status = BroadcastStatus.SENT
+        delay = await session.scalar(
+            select(func.extract("epoch", next_at - func.now()))
+            .where(Broadcast.status.in_([BroadcastStatus.PENDING, BroadcastStatus.IN_PROGRESS]))
+        )
+    if delay is None:
+        return None
+    return max(0.0, float(delay))
+
+
+def _on_broadcasts_changed(key: Optional[str]) -> None:
+    broadcast_wakeup.set()
+
+
+broadcast_wakeup = asyncio.Event()
+invalidation_bus.subscribe("broadcasts", _on_broadcasts_changed)
+
+
+async def run_broadcast_scheduler() -> None:
+    """
+    Отправляет готовые рассылки, затем спит до ближайшего scheduled_at или до
+    уведомления из админки о новой/изменённой рассылке.
+    """
+    while True:
+        broadcast_wakeup.clear()
+        try:
+            while await run_broadcast_worker_once():
+                pass
+            delay = await seconds_until_next_broadcast()
+        except Exception as e:
+            logger.error("broadcast worker error: %s", e)
+            delay = BROADCAST_ERROR_RETRY_SECONDS
+        timeout = BROADCAST_IDLE_WAKEUP_SECONDS if delay is None else min(delay, BROADCAST_IDLE_WAKEUP_SECONDS)
+        try:
+            await asyncio.wait_for(broadcast_wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
@@ -50,7 +50,7 @@ async def finalize_successful_order(
     Создаёт заказ, списывает баллы с семьи пропорционально и пишет проводки.
     
     Args:
-        user_id: ID пользователя (telegram или БД)
+        user_id: telegram_id пользователя
         product_id: ID товара
         pvz_id: ID ПВЗ для доставки
         full_name: полное имя получателя (для сохранения в профиль)
@@ -104,7 +104,7 @@ async def finalize_successful_order(
         else:
             await purchase_from_user(
                 session=session,
-                user_id_or_telegram=user.id,
+                user_id=user.id,
                 amount=int(product.price),
                 order_id=order.id,
                 title="Покупка в каталоге",
@@ -1,15 +1,29 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import os
-from typing import Any, Optional, Tuple
+import string
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
 from aiogram.types import FSInputFile
 from sqlalchemy import select, update
 
 from app.steps_bot.db.models.captions import Content, MediaType
 from app.steps_bot.db.repo import get_session
+from app.steps_bot.services.invalidation_bus import invalidation_bus
 from app.steps_bot.settings import config
 
+logger = logging.getLogger(__name__)
+
+# Сколько slug держать в кэше
+CONTENT_CACHE_SIZE = 512
+# Задержка, за которую копятся file_id перед записью в БД
+FILE_ID_FLUSH_DELAY_SECONDS = 2.0
+
+_formatter = string.Formatter()
+
 
 def _abs_media_path(path: Optional[str]) -> Optional[str]:
     """
@@ -22,31 +36,178 @@ def _abs_media_path(path: Optional[str]) -> Optional[str]:
     return os.path.join(config.MEDIA_ROOT, path)
 
 
-async def get_content(slug: str, **fmt: Any) -> Optional[Tuple[Content, str]]:
+class _Template:
+    """
+    Текст контента, разобранный на куски один раз при загрузке в кэш.
+    Сложные поля ({a.b}, {a[0]}) форматируются обычным str.format.
+    """
+    __slots__ = ("text", "parts", "simple")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        try:
+            self.parts = list(_formatter.parse(text))
+        except ValueError:
+            self.parts = []
+        self.simple = all(
+            field is None or (field.isidentifier() and not conv)
+            for _, field, _, conv in self.parts
+        )
+
+    def render(self, fmt: Dict[str, Any]) -> str:
+        if not fmt:
+            return self.text
+        if not self.simple or not self.parts:
+            return self.text.format(**fmt)
+        out: List[str] = []
+        for literal, field, spec, _ in self.parts:
+            out.append(literal)
+            if field is not None:
+                out.append(format(fmt[field], spec or ""))
+        return "".join(out)
+
+
+class CachedContent:
+    """
+    Неизменяемая копия строки contents, отвязанная от сессии БД.
+    """
+    __slots__ = (
+        "id",
+        "slug",
+        "text",
+        "media_type",
+        "telegram_file_id",
+        "media_url",
+        "media_file",
+        "template",
+    )
+
+    def __init__(self, row: Content) -> None:
+        self.id = row.id
+        self.slug = row.slug
+        self.text = row.text
+        self.media_type = row.media_type
+        self.telegram_file_id = row.telegram_file_id
+        self.media_url = row.media_url
+        self.media_file = row.media_file
+        self.template = _Template(row.text)
+
+
+class ContentCache:
+    """
+    LRU-кэш контента по slug. Отсутствующие slug тоже кэшируются; любое
+    изменение таблицы contents в админке сбрасывает затронутые записи.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._items: "OrderedDict[str, Optional[CachedContent]]" = OrderedDict()
+        self._slug_by_id: Dict[int, str] = {}
+        self._pending_file_ids: Dict[int, str] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, slug: str) -> Optional[CachedContent]:
+        if slug in self._items:
+            self._items.move_to_end(slug)
+            self.hits += 1
+            return self._items[slug]
+        self.misses += 1
+        async with get_session() as session:
+            result = await session.scalars(select(Content).where(Content.slug == slug))
+            row = result.first()
+            item = CachedContent(row) if row else None
+        self._put(slug, item)
+        return item
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """
+        Сбрасывает запись по id строки contents, а если id неизвестен — весь кэш
+        (новая строка могла заполнить ранее отсутствовавший slug).
+        """
+        slug = self._slug_by_id.pop(int(key), None) if key and key.isdigit() else None
+        if slug is None:
+            self._items.clear()
+            self._slug_by_id.clear()
+            return
+        self._items.pop(slug, None)
+
+    def remember_file_id(self, content_id: int, file_id: str) -> None:
+        """
+        Сразу подставляет file_id в кэш, а в БД пишет пачкой с небольшой задержкой.
+        """
+        if not file_id:
+            return
+        slug = self._slug_by_id.get(content_id)
+        item = self._items.get(slug) if slug else None
+        if item is not None:
+            item.telegram_file_id = file_id
+        self._pending_file_ids[content_id] = file_id
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def flush(self) -> None:
+        if not self._pending_file_ids:
+            return
+        pending, self._pending_file_ids = self._pending_file_ids, {}
+        try:
+            async with get_session() as session:
+                await session.execute(
+                    update(Content),
+                    [{"id": cid, "telegram_file_id": fid} for cid, fid in pending.items()],
+                )
+        except Exception:
+            for cid, fid in pending.items():
+                self._pending_file_ids.setdefault(cid, fid)
+            raise
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("content file_id flush failed: %s", e)
+
+    def _put(self, slug: str, item: Optional[CachedContent]) -> None:
+        self._items[slug] = item
+        self._items.move_to_end(slug)
+        if item is not None:
+            self._slug_by_id[item.id] = slug
+        while len(self._items) > self.max_size:
+            _, old = self._items.popitem(last=False)
+            if old is not None:
+                self._slug_by_id.pop(old.id, None)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(FILE_ID_FLUSH_DELAY_SECONDS)
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error("content file_id flush failed: %s", e)
+
+
+content_cache = ContentCache(max_size=CONTENT_CACHE_SIZE)
+invalidation_bus.subscribe("contents", content_cache.invalidate)
+
+
+async def get_content(slug: str, **fmt: Any) -> Optional[Tuple[CachedContent, str]]:
     """
     Возвращает кортеж (контент, отформатированный текст) по slug.
     """
-    async with get_session() as session:
-        result = await session.scalars(select(Content).where(Content.slug == slug))
-        content = result.first()
-        if not content:
-            return None
-        text = content.text.format(**fmt) if fmt else content.text
-        return content, text
+    content = await content_cache.get(slug)
+    if not content:
+        return None
+    return content, content.template.render(fmt)
 
 
 async def _cache_file_id(content_id: int, file_id: str) -> None:
     """
     Сохраняет telegram_file_id для последующих отправок без загрузки.
     """
-    if not file_id:
-        return
-    async with get_session() as session:
-        await session.execute(
-            update(Content)
-            .where(Content.id == content_id)
-            .values(telegram_file_id=file_id)
-        )
+    content_cache.remember_file_id(content_id, file_id)
 
 
 async def render(
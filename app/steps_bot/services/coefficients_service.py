@@ -1,37 +1,170 @@
 from __future__ import annotations
 
+import asyncio
+import bisect
+import logging
+from typing import Dict, List, Optional, Tuple
+
 from sqlalchemy import select
 
 from app.steps_bot.db.repo import get_session
 from app.steps_bot.db.models.walk import WalkForm, WalkFormCoefficient
 from app.steps_bot.db.models.coefficients import TemperatureCoefficient
+from app.steps_bot.services.invalidation_bus import invalidation_bus
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
+
+class _TempIndex:
+    """
+    Температурные диапазоны одной формы прогулки, отсортированные по нижней границе.
+    """
+    __slots__ = ("mins", "ranges")
+
+    def __init__(self, ranges: List[Tuple[int, int, int]]) -> None:
+        self.ranges = sorted(ranges)
+        self.mins = [r[0] for r in self.ranges]
+
+    def lookup(self, temp_c: int) -> Optional[int]:
+        i = bisect.bisect_right(self.mins, temp_c) - 1
+        # Диапазоны могут пересекаться: идём назад до первого, который покрывает temp_c
+        while i >= 0:
+            lo, hi, coef = self.ranges[i]
+            if hi >= temp_c:
+                return coef
+            i -= 1
+        return None
+
+
+class CoefficientsSnapshot:
+    """
+    Снимок таблиц коэффициентов в памяти процесса. Таблицы маленькие и меняются
+    редко, поэтому множитель считается без обращения к БД. Снимок перечитывается
+    по событию из админки (invalidation_bus) и на всякий случай раз в reload_interval секунд.
+    """
+
+    def __init__(self, reload_interval: float) -> None:
+        self.reload_interval = reload_interval
+        self._forms: Dict[WalkForm, int] = {}
+        self._temps: Dict[WalkForm, _TempIndex] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Optional[asyncio.Task] = None
+        # Событие пришло во время перезагрузки: она могла прочитать таблицы до изменения
+        self._dirty = False
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    async def open(self) -> None:
+        try:
+            await self.reload()
+        except Exception as e:
+            logger.error("coefficients load failed: %s", e)
+        if self._task is None:
+            self._task = asyncio.create_task(self._reload_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def reload(self) -> None:
+        """
+        Перечитывает обе таблицы одной сессией и атомарно подменяет снимок.
+        """
+        async with self._lock:
+            async with get_session() as s:
+                forms = (await s.execute(
+                    select(WalkFormCoefficient.walk_form, WalkFormCoefficient.coefficient)
+                )).all()
+                temps = (await s.execute(
+                    select(
+                        TemperatureCoefficient.walk_form,
+                        TemperatureCoefficient.min_temp_c,
+                        TemperatureCoefficient.max_temp_c,
+                        TemperatureCoefficient.coefficient,
+                    )
+                )).all()
+
+            by_form: Dict[WalkForm, List[Tuple[int, int, int]]] = {}
+            for form, lo, hi, coef in temps:
+                by_form.setdefault(form, []).append((int(lo), int(hi), int(coef)))
+
+            self._forms = {form: int(coef) for form, coef in forms}
+            self._temps = {form: _TempIndex(rows) for form, rows in by_form.items()}
+            self._loaded = True
+        logger.info("Loaded coefficients: %s forms, %s temperature ranges", len(forms), len(temps))
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """
+        Планирует перечитывание снимка; пачка событий подряд даёт одну перезагрузку,
+        событие во время перезагрузки — ещё одну после неё.
+        """
+        self._dirty = True
+        if self._pending is None or self._pending.done():
+            self._pending = asyncio.create_task(self._reload_quietly())
+
+    async def ensure_loaded(self) -> None:
+        if not self._loaded:
+            await self.reload()
+
+    def walk_form_coef(self, form: WalkForm) -> int:
+        return int(self._forms.get(form) or 1)
+
+    def temperature_coef(self, form: WalkForm, temp_c: int | None) -> int:
+        if temp_c is None:
+            return 1
+        index = self._temps.get(form)
+        if index is None:
+            return 1
+        return int(index.lookup(temp_c) or 1)
+
+    def total_multiplier(self, form: WalkForm, temp_c: int | None = None) -> int:
+        """Итоговый множитель = коэффициент формы × (опционально) температурный коэффициент."""
+        return max(1, self.walk_form_coef(form) * self.temperature_coef(form, temp_c))
+
+    async def _reload_quietly(self) -> None:
+        while self._dirty:
+            self._dirty = False
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error("coefficients reload failed: %s", e)
+                return
+
+    async def _reload_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error("coefficients reload failed: %s", e)
+
+
+coefficients = CoefficientsSnapshot(reload_interval=config.COEFFICIENTS_RELOAD_SECONDS)
+invalidation_bus.subscribe("walk_form_coefficients", coefficients.invalidate)
+invalidation_bus.subscribe("temperature_coefficients", coefficients.invalidate)
 
 
 async def get_walk_form_coef(form: WalkForm) -> int:
-    async with get_session() as s:
-        q = select(WalkFormCoefficient.coefficient).where(WalkFormCoefficient.walk_form == form)
-        res = await s.execute(q)
-        coef = res.scalar_one_or_none()
-        return int(coef or 1)
+    await coefficients.ensure_loaded()
+    return coefficients.walk_form_coef(form)
 
 
 async def get_temperature_coef(form: WalkForm, temp_c: int | None) -> int:
-    if temp_c is None:
-        return 1
-    async with get_session() as s:
-        q = (
-            select(TemperatureCoefficient.coefficient)
-            .where(TemperatureCoefficient.walk_form == form)
-            .where(TemperatureCoefficient.min_temp_c <= temp_c)
-            .where(TemperatureCoefficient.max_temp_c >= temp_c)
-        )
-        res = await s.execute(q)
-        coef = res.scalar_one_or_none()
-        return int(coef or 1)
+    await coefficients.ensure_loaded()
+    return coefficients.temperature_coef(form, temp_c)
 
 
 async def get_total_multiplier(form: WalkForm, temp_c: int | None = None) -> int:
     """Итоговый множитель = коэффициент формы × (опционально) температурный коэффициент."""
-    base = await get_walk_form_coef(form)
-    temp = await get_temperature_coef(form, temp_c)
-    return max(1, base * temp)
+    await coefficients.ensure_loaded()
+    return coefficients.total_multiplier(form, temp_c)
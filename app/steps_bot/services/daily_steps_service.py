@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.steps_bot.db.models.daily_steps import DailyStepUsage
+from app.steps_bot.db.repo import get_session, resolve_user_id
+from app.steps_bot.services.invalidation_bus import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+# Верхняя граница кэша; при переполнении он просто очищается
+CACHE_MAX_SIZE = 50_000
+# Сколько доверять закэшированному значению: прогулку могла завершить другая
+# реплика, а событие об этом — потеряться
+CACHE_TTL_SECONDS = 60.0
+
+# Событие шины инвалидации об изменении дневного счётчика, ключ — telegram_id
+USAGE_EVENT = "daily_step_usage"
+
+# telegram_id -> (день, использовано шагов за этот день, time.monotonic() записи)
+_used_cache: Dict[int, Tuple[dt.date, int, float]] = {}
+
+
+def _today() -> dt.date:
+    return dt.date.today()
+
+
+def _remember(telegram_id: int, day: dt.date, used: int) -> None:
+    if len(_used_cache) >= CACHE_MAX_SIZE and telegram_id not in _used_cache:
+        _used_cache.clear()
+    _used_cache[telegram_id] = (day, used, time.monotonic())
+
+
+async def get_used_steps(telegram_id: int) -> int:
+    """
+    Возвращает количество шагов, уже засчитанных пользователю сегодня.
+    Значение берётся из кэша процесса (не старше CACHE_TTL_SECONDS), при
+    промахе — одним запросом из БД.
+    """
+    today = _today()
+    cached = _used_cache.get(telegram_id)
+    if cached is not None and cached[0] == today and time.monotonic() - cached[2] < CACHE_TTL_SECONDS:
+        return cached[1]
+
+    async with get_session() as s:
+        user_id = await resolve_user_id(s, telegram_id)
+        used = None
+        if user_id is not None:
+            used = await s.scalar(
+                select(DailyStepUsage.steps_used)
+                .where(DailyStepUsage.user_id == user_id, DailyStepUsage.day == today)
+            )
+    used = int(used or 0)
+    _remember(telegram_id, today, used)
+    return used
+
+
+async def publish_used_steps(telegram_id: int) -> None:
+    """
+    Сообщает всем процессам бота, включая этот, что дневной счётчик
+    пользователя изменился: следующий get_used_steps перечитает его из БД.
+    """
+    forget_used_steps(telegram_id)
+    await invalidation_bus.publish(USAGE_EVENT, str(telegram_id))
+
+
+def forget_used_steps(telegram_id: int) -> None:
+    _used_cache.pop(telegram_id, None)
+
+
+def _on_usage_changed(key: Optional[str]) -> None:
+    if key is None:
+        _used_cache.clear()
+    else:
+        forget_used_steps(int(key))
+
+
+invalidation_bus.subscribe(USAGE_EVENT, _on_usage_changed)
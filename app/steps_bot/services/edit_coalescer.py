@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
+
+class _ChatEdits:
+    __slots__ = (
+        "last_hash",
+        "last_sent_at",
+        "blocked_until",
+        "pending",
+        "timer",
+    )
+
+    def __init__(self) -> None:
+        self.last_hash: Optional[int] = None
+        self.last_sent_at = 0.0
+        self.blocked_until = 0.0
+        # (bot, message_id, text, reply_markup, hash) последнего ещё не отправленного состояния
+        self.pending: Optional[tuple] = None
+        self.timer: Optional[asyncio.Task] = None
+
+
+class EditCoalescer:
+    """
+    Склеивает правки одного сообщения в чате: одинаковый текст не отправляется,
+    правки идут не чаще раза в min_interval секунд, последнее состояние всегда
+    доставляется, а TelegramRetryAfter откладывает следующую попытку.
+    """
+
+    def __init__(self, min_interval: float) -> None:
+        self.min_interval = min_interval
+        self._chats: Dict[int, _ChatEdits] = {}
+        self.sent = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+    async def edit(
+        self,
+        bot: Bot,
+        chat_id: int,
+        message_id: int,
+        text: str,
+        reply_markup: Any = None,
+    ) -> None:
+        """
+        Ставит правку в очередь. Если окно свободно, правка отправляется сразу,
+        и TelegramBadRequest (кроме «message is not modified») пробрасывается вызывающему.
+        """
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = _ChatEdits()
+
+        text_hash = hash((message_id, text))
+        if text_hash == state.last_hash and state.pending is None:
+            self.dropped += 1
+            return
+        if state.pending is not None:
+            # Промежуточное состояние заменяется более свежим
+            self.dropped += 1
+        state.pending = (bot, message_id, text, reply_markup, text_hash)
+
+        if state.timer is not None:
+            return
+        delay = self._next_allowed_at(state) - time.monotonic()
+        if delay > 0:
+            state.timer = asyncio.create_task(self._flush_later(chat_id, state, delay))
+            return
+        await self._send_pending(chat_id, state)
+
+    async def finalize(
+        self,
+        bot: Bot,
+        chat_id: int,
+        message_id: int,
+        text: str,
+        reply_markup: Any = None,
+    ) -> None:
+        """
+        Отменяет отложенные правки и отправляет итоговый текст, дождавшись
+        окончания RetryAfter. Состояние чата после этого забывается.
+        """
+        state = self._chats.pop(chat_id, None)
+        if state is not None:
+            if state.timer is not None:
+                state.timer.cancel()
+            wait = state.blocked_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        try:
+            await bot.edit_message_text(
+                chat_id=chat_id, message_id=message_id, text=text, reply_markup=reply_markup
+            )
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            await bot.edit_message_text(
+                chat_id=chat_id, message_id=message_id, text=text, reply_markup=reply_markup
+            )
+        self.sent += 1
+
+    def forget(self, chat_id: int) -> None:
+        state = self._chats.pop(chat_id, None)
+        if state is not None and state.timer is not None:
+            state.timer.cancel()
+
+    def _next_allowed_at(self, state: _ChatEdits) -> float:
+        return max(state.last_sent_at + self.min_interval, state.blocked_until)
+
+    async def _flush_later(self, chat_id: int, state: _ChatEdits, delay: float) -> None:
+        await asyncio.sleep(delay)
+        state.timer = None
+        if self._chats.get(chat_id) is not state:
+            return
+        try:
+            await self._send_pending(chat_id, state)
+        except TelegramBadRequest as e:
+            logger.warning("delayed edit failed for chat %s: %s", chat_id, e)
+        except Exception:
+            logger.exception("delayed edit failed for chat %s", chat_id)
+
+    async def _send_pending(self, chat_id: int, state: _ChatEdits) -> None:
+        if state.pending is None:
+            return
+        bot, message_id, text, reply_markup, text_hash = state.pending
+        state.pending = None
+        state.last_sent_at = time.monotonic()
+        try:
+            await bot.edit_message_text(
+                chat_id=chat_id, message_id=message_id, text=text, reply_markup=reply_markup
+            )
+        except TelegramRetryAfter as e:
+            state.blocked_until = time.monotonic() + e.retry_after
+            if state.pending is None:
+                state.pending = (bot, message_id, text, reply_markup, text_hash)
+            if state.timer is None:
+                state.timer = asyncio.create_task(
+                    self._flush_later(chat_id, state, e.retry_after)
+                )
+            return
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                raise
+        state.last_hash = text_hash
+        self.sent += 1
+
+
+walk_status_editor = EditCoalescer(min_interval=config.WALK_STATUS_EDIT_INTERVAL)
@@ -4,7 +4,7 @@ from sqlalchemy import select, and_, func, delete, update
 from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError
 
-from app.steps_bot.db.repo import get_session
+from app.steps_bot.db.repo import get_session, get_user_by_telegram
 from app.steps_bot.services.ledger_service import transfer_user_to_family
 from app.steps_bot.db.models.family import (
     Family,
@@ -27,9 +27,7 @@ class FamilyService:
             raise ValueError("Название слишком длинное")
 
         async with get_session() as session:
-            user = await session.scalar(
-                select(User).where(User.telegram_id == telegram_id)
-            )
+            user = await get_user_by_telegram(session, telegram_id)
             if not user or not user.family_id:
                 raise ValueError("Вы не состоите в семье")
 
@@ -48,9 +46,7 @@ class FamilyService:
     @staticmethod
     async def get_family_info(telegram_id: int) -> tuple[Family | None, list[User]]:
         async with get_session() as session:
-            user = await session.scalar(
-                select(User).where(User.telegram_id == telegram_id)
-            )
+            user = await get_user_by_telegram(session, telegram_id)
             if not user or not user.family_id:
                 return None, []
 
@@ -65,9 +61,7 @@ class FamilyService:
     @staticmethod
     async def create_family(telegram_id: int, name: str) -> Family:
         async with get_session() as session:
-            owner = await session.scalar(
-                select(User).where(User.telegram_id == telegram_id)
-            )
+            owner = await get_user_by_telegram(session, telegram_id)
             if not owner:
                 raise ValueError("owner not found")
             if owner.family_id:
@@ -158,9 +152,7 @@ class FamilyService:
             if not inv or inv.status != FamilyInviteStatus.PENDING:
                 raise ValueError("Приглашение не найдено или уже обработано")
 
-            invitee = await session.scalar(
-                select(User).where(User.telegram_id == invitee_tg)
-            )
+            invitee = await get_user_by_telegram(session, invitee_tg)
             if not invitee or invitee.id != inv.invitee_id:
                 raise ValueError("Это приглашение не для вас")
 
@@ -189,9 +181,7 @@ class FamilyService:
     @staticmethod
     async def leave_family(telegram_id: int):
         async with get_session() as session:
-            user = await session.scalar(
-                select(User).where(User.telegram_id == telegram_id)
-            )
+            user = await get_user_by_telegram(session, telegram_id)
             if not user or not user.family_id:
                 return
 
@@ -218,9 +208,7 @@ class FamilyService:
     @staticmethod
     async def get_members(telegram_id: int) -> List[User]:
         async with get_session() as session:
-            user = await session.scalar(
-                select(User).where(User.telegram_id == telegram_id)
-            )
+            user = await get_user_by_telegram(session, telegram_id)
             if not user or not user.family_id:
                 return []
 
@@ -232,7 +220,7 @@ class FamilyService:
     @staticmethod
     async def kick_member(owner_tg: int, member_db_id: int):
         async with get_session() as session:
-            owner = await session.scalar(select(User).where(User.telegram_id == owner_tg))
+            owner = await get_user_by_telegram(session, owner_tg)
             victim = await session.get(User, member_db_id)
 
             if not owner or not victim or owner.family_id != victim.family_id:
@@ -274,9 +262,7 @@ class FamilyService:
     @staticmethod
     async def disband_family(owner_tg: int):
         async with get_session() as session:
-            owner = await session.scalar(
-                select(User).where(User.telegram_id == owner_tg)
-            )
+            owner = await get_user_by_telegram(session, owner_tg)
             if not owner or not owner.family_id:
                 raise ValueError("Вы не состоите в семье")
 
@@ -300,7 +286,7 @@ class FamilyService:
     @staticmethod
     async def get_family_stats(telegram_id: int) -> tuple[Family | None, list[User], int, int, int, int]:
         async with get_session() as session:
-            user = await session.scalar(select(User).where(User.telegram_id == telegram_id))
+            user = await get_user_by_telegram(session, telegram_id)
             if not user:
                 return None, [], 0, 0, 0, 0
 
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+import asyncpg
+from sqlalchemy import text
+
+from app.steps_bot.db.session import engine
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
+# Канал Postgres, в который админка публикует изменения таблиц
+CHANNEL = "cache_invalidation"
+RECONNECT_DELAY_SECONDS = 5.0
+
+# Обработчик получает ключ изменённой строки или None, если сбросить нужно всё
+Handler = Callable[[Optional[str]], Union[None, Awaitable[None]]]
+
+_NOTIFY_SQL = text("SELECT pg_notify(:channel, :payload)")
+
+
+class InvalidationBus:
+    """
+    Слушает LISTEN cache_invalidation на отдельном соединении asyncpg и раздаёт
+    события {"table": ..., "key": ...} подписанным локальным кэшам. Это
+    соединение только слушает: публикация идёт через пул SQLAlchemy, потому что
+    asyncpg не выполняет параллельные запросы на одном соединении.
+
+    После переподключения подписчики-кэши получают key=None: пока соединения
+    не было, события могли потеряться. Подписчики-команды (replay=False,
+    например прогрев медиа) при этом не вызываются — пропущенную команду
+    повторять незачем, а выполнять её на каждый обрыв связи дорого.
+    """
+
+    def __init__(self) -> None:
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._replayed: Dict[str, List[Handler]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[asyncpg.Connection] = None
+        self.received = 0
+
+    def subscribe(self, table: str, handler: Handler, replay: bool = True) -> None:
+        self._handlers.setdefault(table, []).append(handler)
+        if replay:
+            self._replayed.setdefault(table, []).append(handler)
+
+    async def open(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, table: str, key: Optional[str] = None) -> None:
+        """
+        Публикует событие из бота (например, после собственной записи в таблицу).
+        Если уведомление не ушло или слушатель не подключён, событие получают
+        хотя бы локальные подписчики.
+        """
+        listening = self._conn is not None and not self._conn.is_closed()
+        payload = json.dumps({"table": table, "key": key})
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(_NOTIFY_SQL, {"channel": CHANNEL, "payload": payload})
+        except Exception as e:
+            logger.warning("invalidation publish failed for %s: %s", table, e)
+            listening = False
+        if not listening:
+            self.dispatch(table, key)
+
+    def dispatch(self, table: str, key: Optional[str]) -> None:
+        self._call(self._handlers.get(table, ()), table, key)
+
+    def dispatch_all(self) -> None:
+        for table, handlers in list(self._replayed.items()):
+            self._call(handlers, table, None)
+
+    @staticmethod
+    def _call(handlers: List[Handler], table: str, key: Optional[str]) -> None:
+        for handler in handlers:
+            try:
+                result = handler(key)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result).add_done_callback(_log_failure)
+            except Exception:
+                logger.exception("invalidation handler failed for %s", table)
+
+    def _on_notify(self, conn, pid, channel, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+            table = event["table"]
+            key = event.get("key")
+        except (ValueError, KeyError, TypeError):
+            logger.warning("bad invalidation payload: %r", payload)
+            return
+        self.received += 1
+        self.dispatch(table, None if key is None else str(key))
+
+    async def _run(self) -> None:
+        first = True
+        while True:
+            lost = asyncio.Event()
+            try:
+                self._conn = await asyncpg.connect(
+                    host=config.POSTGRES_HOST,
+                    port=config.POSTGRES_PORT,
+                    user=config.POSTGRES_USER,
+                    password=config.POSTGRES_PASSWORD,
+                    database=config.POSTGRES_DB,
+                )
+                self._conn.add_termination_listener(lambda _conn: lost.set())
+                await self._conn.add_listener(CHANNEL, self._on_notify)
+                logger.info("Listening for cache invalidations on %s", CHANNEL)
+                if not first:
+                    self.dispatch_all()
+                first = False
+                await lost.wait()
+                logger.warning("invalidation listener connection lost")
+            except asyncio.CancelledError:
+                if self._conn is not None and not self._conn.is_closed():
+                    await self._conn.close()
+                raise
+            except Exception as e:
+                logger.error("invalidation listener error: %s", e)
+            self._conn = None
+            await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+
+
+def _log_failure(fut: asyncio.Future) -> None:
+    if not fut.cancelled() and fut.exception() is not None:
+        logger.error("invalidation handler failed: %s", fut.exception())
+
+
+invalidation_bus = InvalidationBus()
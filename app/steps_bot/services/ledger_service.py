@@ -6,6 +6,7 @@ from typing import Optional, Sequence, Tuple
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.steps_bot.db.repo import get_user_by_telegram
 from app.steps_bot.db.models.family import Family
 from app.steps_bot.db.models.user import User
 from app.steps_bot.db.models.ledger import (
@@ -13,11 +14,12 @@ from app.steps_bot.db.models.ledger import (
     OwnerType,
     OperationType,
 )
+from app.steps_bot.storage.user_ids import TelegramId, UserId
 
 
 async def transfer_user_to_family(
     session: AsyncSession,
-    user_id_or_telegram: int,
+    telegram_id: TelegramId,
     family_id: int,
     title: str = "Перевод в семейный баланс",
     description: Optional[str] = None,
@@ -26,17 +28,27 @@ async def transfer_user_to_family(
     Переносит весь личный баланс пользователя в баланс семьи. Возвращает запись журнала перевода
     (owner_type=family), если было что переносить. Если баланс нулевой — возвращает None.
     """
-    user = await _get_user_by_id_or_telegram(session, user_id_or_telegram)
+    user = await get_user_by_telegram(session, telegram_id)
     if not user:
         raise ValueError("Пользователь не найден")
 
     fam = (
-        await session.execute(select(Family).where(Family.id == family_id).with_for_update())
+        await session.execute(
+            select(Family)
+            .where(Family.id == family_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
     ).scalar_one_or_none()
     if not fam:
         raise ValueError("Семья не найдена")
 
-    q = select(User).where(User.id == (user.id)).with_for_update()
+    q = (
+        select(User)
+        .where(User.id == (user.id))
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
     ul = (await session.execute(q)).scalar_one()
     amount = int(ul.balance)
     if amount <= 0:
@@ -72,110 +84,6 @@ async def transfer_user_to_family(
     return entry
 
 
-async def _get_user_by_id_or_telegram(
-    session: AsyncSession,
-    user_id_or_telegram: int,
-) -> Optional[User]:
-    """
-    Возвращает пользователя по users.id или users.telegram_id.
-    """
-    user = (
-        await session.execute(
-            select(User).where(User.id == user_id_or_telegram).limit(1)
-        )
-    ).scalar_one_or_none()
-    if user:
-        return user
-    user = (
-        await session.execute(
-            select(User).where(User.telegram_id == user_id_or_telegram).limit(1)
-        )
-    ).scalar_one_or_none()
-    return user
-
-
-async def accrue_steps_points(
-    session: AsyncSession,
-    user_id_or_telegram: int,
-    amount: int,
-    title: str = "Начисление за шаги",
-    description: Optional[str] = None,
-    trigger_referral_reward: bool = True,
-) -> LedgerEntry:
-    """
-    Начисляет баллы за шаги: если пользователь состоит в семье — на баланс семьи,
-    иначе — на личный баланс. Пишет запись в журнал.
-    
-    Args:
-        trigger_referral_reward: Если True, начисляет процент пригласившему (используется для избежания циклических начислений)
-    """
-    if amount <= 0:
-        raise ValueError("Сумма должна быть положительной")
-
-    user = await _get_user_by_id_or_telegram(session, user_id_or_telegram)
-    if not user:
-        raise ValueError("Пользователь не найден")
-
-    if user.family_id:
-        fam = (
-            await session.execute(
-                select(Family).where(Family.id == user.family_id).with_for_update()
-            )
-        ).scalar_one_or_none()
-        if not fam:
-            raise ValueError("Семья не найдена")
-        fam.balance = int(fam.balance) + int(amount)
-        entry = LedgerEntry(
-            owner_type=OwnerType.FAMILY,
-            family_id=fam.id,
-            operation=OperationType.STEPS_ACCRUAL,
-            amount=int(amount),
-            balance_after=int(fam.balance),
-            title=title,
-            description=description,
-            created_at=dt.datetime.now(tz=dt.timezone.utc),
-        )
-        # Также фиксируем пользовательскую проводку для статистики вклада
-        user_entry = LedgerEntry(
-            owner_type=OwnerType.USER,
-            user_id=user.id,
-            operation=OperationType.STEPS_ACCRUAL,
-            amount=int(amount),
-            balance_after=None,
-            title=title,
-            description=description,
-            created_at=dt.datetime.now(tz=dt.timezone.utc),
-        )
-        session.add(user_entry)
-    else:
-        q = select(User).where(User.id == user.id).with_for_update()
-        user_locked = (await session.execute(q)).scalar_one()
-        user_locked.balance = int(user_locked.balance) + int(amount)
-        entry = LedgerEntry(
-            owner_type=OwnerType.USER,
-            user_id=user_locked.id,
-            operation=OperationType.STEPS_ACCRUAL,
-            amount=int(amount),
-            balance_after=int(user_locked.balance),
-            title=title,
-            description=description,
-            created_at=dt.datetime.now(tz=dt.timezone.utc),
-        )
-    session.add(entry)
-    await session.flush()
-    
-    # Реферальное вознаграждение: если пользователь - чей-то реферал, начисляем процент пригласившему
-    if trigger_referral_reward and title in ("Начисление за шаги", "Начисление за прогулку"):
-        from app.steps_bot.services.referral_service import reward_inviter_for_referral_earning
-        await reward_inviter_for_referral_earning(
-            session=session,
-            user_id=user.id,
-            earned_amount=int(amount),
-        )
-    
-    return entry
-
-
 async def purchase_from_family_proportional(
     session: AsyncSession,
     family_id: int,
@@ -193,7 +101,10 @@ async def purchase_from_family_proportional(
 
     family = (
         await session.execute(
-            select(Family).where(Family.id == family_id).with_for_update()
+            select(Family)
+            .where(Family.id == family_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
         )
     ).scalar_one_or_none()
     if not family:
@@ -201,7 +112,10 @@ async def purchase_from_family_proportional(
 
     members = (
         await session.execute(
-            select(User).where(User.family_id == family_id).with_for_update()
+            select(User)
+            .where(User.family_id == family_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
         )
     ).scalars().all()
 
@@ -276,7 +190,7 @@ async def purchase_from_family_proportional(
 
 async def purchase_from_user(
     session: AsyncSession,
-    user_id_or_telegram: int,
+    user_id: UserId,
     amount: int,
     order_id: Optional[int] = None,
     title: str = "Покупка",
@@ -288,12 +202,15 @@ async def purchase_from_user(
     if amount <= 0:
         raise ValueError("Сумма должна быть положительной")
 
-    user = await _get_user_by_id_or_telegram(session, user_id_or_telegram)
-    if not user:
+    q = (
+        select(User)
+        .where(User.id == user_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    user_locked = (await session.execute(q)).scalar_one_or_none()
+    if not user_locked:
         raise ValueError("Пользователь не найден")
-
-    q = select(User).where(User.id == user.id).with_for_update()
-    user_locked = (await session.execute(q)).scalar_one()
     if int(user_locked.balance) < int(amount):
         raise ValueError("Недостаточно баллов")
 
@@ -343,13 +260,13 @@ async def get_user_contribution_points(
 
 async def get_history_for_user_with_family(
     session: AsyncSession,
-    user_id_or_telegram: int,
+    telegram_id: TelegramId,
     limit: int = 20,
 ) -> Tuple[User, Optional[Family], Sequence[LedgerEntry]]:
     """
     Возвращает пользователя, его семью и последние операции по пользователю и семье.
     """
-    user = await _get_user_by_id_or_telegram(session, user_id_or_telegram)
+    user = await get_user_by_telegram(session, telegram_id)
     if not user:
         raise ValueError("Пользователь не найден")
 
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import FSInputFile
+from sqlalchemy import select, update
+
+from app.steps_bot.db.models.broadcast import Broadcast, BroadcastStatus
+from app.steps_bot.db.models.captions import Content
+from app.steps_bot.db.models.catalog import Product
+from app.steps_bot.db.models.faq import FAQ
+from app.steps_bot.db.repo import get_session
+from app.steps_bot.services.invalidation_bus import invalidation_bus
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
+# Событие шины, которым админка просит прогреть медиа
+WARMUP_EVENT = "media_warmup"
+
+# Модели с медиа; media_file есть не у всех
+WARMUP_MODELS = (Content, FAQ, Product, Broadcast)
+
+# (id, "photo" | "video", локальный путь, url)
+_Item = Tuple[int, str, Optional[str], Optional[str]]
+
+_running: Optional[asyncio.Task] = None
+
+
+def _abs_media_path(path: Optional[str]) -> Optional[str]:
+    if not path:
+        return None
+    if os.path.isabs(path):
+        return path
+    return os.path.join(config.MEDIA_ROOT, path)
+
+
+async def _collect(model) -> List[_Item]:
+    """
+    Строки модели с фото/видео, для которых ещё нет telegram_file_id.
+    """
+    q = select(model).where(
+        model.telegram_file_id.is_(None),
+        model.media_type.in_(_media_types(model)),
+    )
+    if model is Broadcast:
+        q = q.where(Broadcast.status == BroadcastStatus.PENDING)
+    async with get_session() as s:
+        rows = (await s.scalars(q)).all()
+
+    items: List[_Item] = []
+    for row in rows:
+        path = _abs_media_path(getattr(row, "media_file", None))
+        if path and not os.path.exists(path):
+            path = None
+        if path or row.media_url:
+            items.append((row.id, row.media_type.value, path, row.media_url))
+    return items
+
+
+def _media_types(model) -> List[Any]:
+    enum_cls = model.media_type.type.enum_class
+    return [enum_cls("photo"), enum_cls("video")]
+
+
+async def _upload(bot: Bot, item: _Item) -> Optional[str]:
+    """
+    Отправляет медиа в служебный чат и возвращает полученный file_id.
+    """
+    _, kind, path, url = item
+    source: Any = FSInputFile(path) if path else url
+    send = bot.send_photo if kind == "photo" else bot.send_video
+    for _attempt in range(2):
+        try:
+            sent = await send(config.MEDIA_STORAGE_CHAT_ID, source, disable_notification=True)
+            break
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+    else:
+        return None
+    if kind == "photo":
+        return sent.photo[-1].file_id if sent.photo else None
+    return sent.video.file_id if sent.video else None
+
+
+async def run_media_warmup_once(bot: Bot) -> Dict[str, int]:
+    """
+    Загружает в служебный чат все медиа без file_id (контент, FAQ, товары,
+    ожидающие рассылки) с ограниченной параллельностью и сохраняет file_id.
+    Возвращает число прогретых записей по таблицам.
+    """
+    if not config.MEDIA_STORAGE_CHAT_ID:
+        logger.info("MEDIA_STORAGE_CHAT_ID is not set, media warm-up skipped")
+        return {}
+
+    sem = asyncio.Semaphore(config.MEDIA_WARMUP_CONCURRENCY)
+
+    async def upload_one(item: _Item) -> Optional[str]:
+        async with sem:
+            try:
+                return await _upload(bot, item)
+            except Exception as e:
+                logger.warning("media warm-up upload failed for #%s: %s", item[0], e)
+                return None
+
+    report: Dict[str, int] = {}
+    for model in WARMUP_MODELS:
+        table = model.__tablename__
+        items = await _collect(model)
+        if not items:
+            continue
+        file_ids = await asyncio.gather(*(upload_one(item) for item in items))
+        rows = [
+            {"id": item[0], "telegram_file_id": file_id}
+            for item, file_id in zip(items, file_ids)
+            if file_id
+        ]
+        if rows:
+            async with get_session() as s:
+                await s.execute(update(model), rows)
+            await invalidation_bus.publish(table)
+        report[table] = len(rows)
+        logger.info("media warm-up: %s: %s of %s uploaded", table, len(rows), len(items))
+    return report
+
+
+def schedule_media_warmup(bot: Bot) -> None:
+    """
+    Запускает прогрев в фоне, если он ещё не идёт.
+    """
+    global _running
+    if _running is not None and not _running.done():
+        return
+
+    async def _run() -> None:
+        try:
+            await run_media_warmup_once(bot)
+        except Exception as e:
+            logger.error("media warm-up failed: %s", e)
+
+    _running = asyncio.create_task(_run())
+
+
+def _on_warmup_requested(key: Optional[str]) -> None:
+    from app.steps_bot.dispatcher import bot
+
+    schedule_media_warmup(bot)
+
+
+invalidation_bus.subscribe(WARMUP_EVENT, _on_warmup_requested, replay=False)
@@ -24,7 +24,7 @@ async def list_active_groups() -> Sequence[PromoGroup]:
 
 async def purchase_and_acquire_code_family(
     group_id: int,
-    user_id_or_telegram: int,
+    telegram_id: int,
 ) -> Tuple[Optional[str], Optional[PromoGroup], Optional[str]]:
     """
     Покупает промокод за баллы семьи, создаёт проводки списания и выдаёт код.
@@ -45,13 +45,14 @@ async def purchase_and_acquire_code_family(
                 )
                 .order_by(PromoCode.id.asc())
                 .with_for_update(skip_locked=True)
+                .execution_options(populate_existing=True)
                 .limit(1)
             )
             code_obj = res.scalars().first()
             if not code_obj:
                 return None, group, "В данной группе нет промокодов"
 
-            user, family, _ = await get_user_with_family(session, user_id_or_telegram)
+            user, family, _ = await get_user_with_family(session, telegram_id)
             if not family:
                 return None, group, "Для покупки требуется семья"
 
@@ -97,6 +98,7 @@ async def acquire_code(group_id: int) -> Tuple[Optional[str], Optional[PromoGrou
                 )
                 .order_by(PromoCode.id.asc())
                 .with_for_update(skip_locked=True)
+                .execution_options(populate_existing=True)
                 .limit(1)
             )
             code_obj = res.scalars().first()
@@ -10,10 +10,8 @@ from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.steps_bot.db.models.user import User
-from app.steps_bot.db.models.family import Family
 from app.steps_bot.db.models.referral import Referral
-from app.steps_bot.db.repo import get_session
-from app.steps_bot.services.ledger_service import accrue_steps_points
+from app.steps_bot.db.repo import get_session, get_user_by_telegram
 from app.steps_bot.services.settings_service import SettingsService
 
 logger = logging.getLogger(__name__)
@@ -25,13 +23,8 @@ DEFAULT_REFERRAL_REWARD_PERCENT = 10  # 10% по умолчанию
 
 async def get_referral_reward_percent() -> int:
     """Получить процент вознаграждения за реферала из настроек."""
-    percent_str = await SettingsService.get_setting(REFERRAL_REWARD_PERCENT_KEY)
-    if percent_str:
-        try:
-            return int(percent_str)
-        except ValueError:
-            logger.warning(f"Invalid referral reward percent: {percent_str}, using default")
-    return DEFAULT_REFERRAL_REWARD_PERCENT
+    await SettingsService.ensure_fresh()
+    return SettingsService.get_int(REFERRAL_REWARD_PERCENT_KEY, DEFAULT_REFERRAL_REWARD_PERCENT)
 
 
 async def set_referral_reward_percent(percent: int) -> None:
@@ -54,12 +47,8 @@ async def create_referral(
     - Один из пользователей не найден
     """
     # Получаем обоих пользователей
-    user = await session.scalar(
-        select(User).where(User.telegram_id == user_telegram_id)
-    )
-    inviter = await session.scalar(
-        select(User).where(User.telegram_id == inviter_telegram_id)
-    )
+    user = await get_user_by_telegram(session, user_telegram_id)
+    inviter = await get_user_by_telegram(session, inviter_telegram_id)
     
     if not user or not inviter:
         logger.warning(f"User or inviter not found: user={user_telegram_id}, inviter={inviter_telegram_id}")
@@ -92,99 +81,6 @@ async def create_referral(
     return referral
 
 
-async def reward_inviter_for_referral_earning(
-    session: AsyncSession,
-    user_id: int,
-    earned_amount: int,
-) -> Optional[int]:
-    """
-    Начисляет пригласившему процент от заработка реферала.
-    
-    Args:
-        session: Сессия БД
-        user_id: ID пользователя (реферала), который заработал баллы
-        earned_amount: Количество заработанных баллов
-    
-    Returns:
-        Optional[int]: Количество начисленных баллов пригласившему или None
-    """
-    # Проверяем, является ли пользователь чьим-то рефералом
-    referral = await session.scalar(
-        select(Referral).where(Referral.user_id == user_id)
-    )
-    
-    if not referral:
-        return None  # Пользователь не является рефералом
-    
-    # Получаем процент вознаграждения
-    reward_percent = await get_referral_reward_percent()
-    
-    # Рассчитываем вознаграждение (округляем вниз)
-    reward_amount = int((earned_amount * reward_percent) / 100)
-    
-    if reward_amount <= 0:
-        return None
-    
-    # Обновляем накопленное вознаграждение в записи реферала
-    referral.reward_points += reward_amount
-    
-    # Получаем реферала для информации
-    referred_user = await session.scalar(
-        select(User).where(User.id == user_id)
-    )
-    
-    # Начисляем баллы пригласившему напрямую (без создания пользовательских записей для статистики)
-    from app.steps_bot.db.models.ledger import LedgerEntry, OwnerType, OperationType
-    from app.steps_bot.db.models.family import Family
-    import datetime as dt
-    
-    inviter = await session.scalar(
-        select(User).where(User.id == referral.inviter_id).with_for_update()
-    )
-    
-    if inviter.family_id:
-        # Начисляем в семейный баланс
-        fam = await session.scalar(
-            select(Family).where(Family.id == inviter.family_id).with_for_update()
-        )
-        if fam:
-            fam.balance = int(fam.balance) + reward_amount
-            entry = LedgerEntry(
-                owner_type=OwnerType.FAMILY,
-                family_id=fam.id,
-                operation=OperationType.PROMO_ACCRUAL,  # Используем PROMO_ACCRUAL для реферальных
-                amount=reward_amount,
-                balance_after=int(fam.balance),
-                title="Реферальное начисление",
-                description=f"Вознаграждение {reward_percent}% от заработка реферала @{referred_user.username or referred_user.telegram_id}",
-                created_at=dt.datetime.now(tz=dt.timezone.utc),
-            )
-            session.add(entry)
-    else:
-        # Начисляем на личный баланс
-        inviter.balance = int(inviter.balance) + reward_amount
-        entry = LedgerEntry(
-            owner_type=OwnerType.USER,
-            user_id=inviter.id,
-            operation=OperationType.PROMO_ACCRUAL,  # Используем PROMO_ACCRUAL для реферальных
-            amount=reward_amount,
-            balance_after=int(inviter.balance),
-            title="Реферальное начисление",
-            description=f"Вознаграждение {reward_percent}% от заработка реферала @{referred_user.username or referred_user.telegram_id}",
-            created_at=dt.datetime.now(tz=dt.timezone.utc),
-        )
-        session.add(entry)
-    
-    await session.flush()
-    logger.info(
-        f"Referral reward: inviter_id={referral.inviter_id}, "
-        f"referral_id={user_id}, earned={earned_amount}, "
-        f"reward={reward_amount} ({reward_percent}%)"
-    )
-    
-    return reward_amount
-
-
 async def get_referral_stats(telegram_id: int) -> Tuple[int, int]:
     """
     Возвращает статистику по рефералам для пользователя.
@@ -193,9 +89,7 @@ async def get_referral_stats(telegram_id: int) -> Tuple[int, int]:
         Tuple[int, int]: (количество рефералов, заработанные баллы)
     """
     async with get_session() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == telegram_id)
-        )
+        user = await get_user_by_telegram(session, telegram_id)
         if not user:
             return 0, 0
         
@@ -220,9 +114,7 @@ async def get_referrals_list(telegram_id: int, offset: int = 0, limit: int = 10)
         List[str]: Список имен рефералов
     """
     async with get_session() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == telegram_id)
-        )
+        user = await get_user_by_telegram(session, telegram_id)
         if not user:
             return []
         
@@ -0,0 +1,178 @@
+"""
+Сегменты аудитории рассылок.
+
+Сегмент хранится в broadcasts.segment как JSON-объект, пустой объект или NULL
+означает «все активные пользователи». Поддерживаемые ключи:
+
+    in_family               true — только состоящие в семье, false — только без семьи
+    balance_min/max         диапазон баланса, границы включительно
+    steps_min/max           диапазон users.step_count, границы включительно
+    walked_within_days      гуляли (засчитывались шаги) за последние N дней
+    not_walked_within_days  не гуляли последние N дней
+    invited_by              telegram_id пригласившего по реферальной ссылке
+    registered_after/before дата регистрации "YYYY-MM-DD", границы включительно
+
+Модуль не зависит от настроек бота и ORM-моделей, поэтому его же импортирует
+Django-админка для предпросмотра числа получателей тем же запросом.
+"""
+from __future__ import annotations
+
+import datetime as dt
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Date,
+    DateTime,
+    Integer,
+    column,
+    exists,
+    func,
+    literal,
+    select,
+    table,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import ColumnElement, Select
+
+users = table(
+    "users",
+    column("id", BigInteger),
+    column("telegram_id", BigInteger),
+    column("family_id", Integer),
+    column("balance", Integer),
+    column("step_count", Integer),
+    column("is_active", Boolean),
+    column("created_at", DateTime(timezone=True)),
+)
+referrals = table(
+    "referrals",
+    column("user_id", BigInteger),
+    column("inviter_id", BigInteger),
+)
+daily_step_usage = table(
+    "daily_step_usage",
+    column("user_id", BigInteger),
+    column("day", Date),
+)
+
+_BOOL_KEYS = ("in_family",)
+_INT_KEYS = ("balance_min", "balance_max", "steps_min", "steps_max", "invited_by")
+_DAYS_KEYS = ("walked_within_days", "not_walked_within_days")
+_DATE_KEYS = ("registered_after", "registered_before")
+SEGMENT_KEYS = _BOOL_KEYS + _INT_KEYS + _DAYS_KEYS + _DATE_KEYS
+
+
+def parse_segment(raw: Any) -> Dict[str, Any]:
+    """
+    Проверяет сегмент и приводит значения к типам Python.
+    Неизвестные ключи и неверные значения — ValueError.
+    """
+    if raw is None:
+        return {}
+    if not isinstance(raw, dict):
+        raise ValueError("Сегмент должен быть JSON-объектом")
+    unknown = sorted(set(raw) - set(SEGMENT_KEYS))
+    if unknown:
+        raise ValueError(f"Неизвестные поля сегмента: {', '.join(unknown)}")
+
+    segment: Dict[str, Any] = {}
+    for key, value in raw.items():
+        if value is None:
+            continue
+        if key in _BOOL_KEYS:
+            if not isinstance(value, bool):
+                raise ValueError(f"{key}: ожидается true или false")
+            segment[key] = value
+        elif key in _INT_KEYS or key in _DAYS_KEYS:
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f"{key}: ожидается целое число")
+            if key in _DAYS_KEYS and value < 1:
+                raise ValueError(f"{key}: ожидается число дней не меньше 1")
+            segment[key] = value
+        else:
+            try:
+                segment[key] = dt.date.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{key}: ожидается дата в формате YYYY-MM-DD") from None
+
+    for low, high in (("balance_min", "balance_max"), ("steps_min", "steps_max"), ("registered_after", "registered_before")):
+        if low in segment and high in segment and segment[low] > segment[high]:
+            raise ValueError(f"{low} больше {high}")
+    return segment
+
+
+def _walked_since(days: int, today: dt.date) -> ColumnElement:
+    return exists().where(
+        daily_step_usage.c.user_id == users.c.id,
+        daily_step_usage.c.day > today - dt.timedelta(days=days),
+    )
+
+
+def segment_conditions(raw: Any, today: Optional[dt.date] = None) -> List[ColumnElement]:
+    """
+    Условия WHERE по таблице users для сегмента (включая is_active).
+    """
+    segment = parse_segment(raw)
+    today = today or dt.date.today()
+    conds: List[ColumnElement] = [users.c.is_active.is_(True)]
+
+    if "in_family" in segment:
+        conds.append(
+            users.c.family_id.isnot(None) if segment["in_family"] else users.c.family_id.is_(None)
+        )
+    if "balance_min" in segment:
+        conds.append(users.c.balance >= segment["balance_min"])
+    if "balance_max" in segment:
+        conds.append(users.c.balance <= segment["balance_max"])
+    if "steps_min" in segment:
+        conds.append(users.c.step_count >= segment["steps_min"])
+    if "steps_max" in segment:
+        conds.append(users.c.step_count <= segment["steps_max"])
+
+    # Проверки по другим таблицам идут через EXISTS по индексам
+    # daily_step_usage (user_id, day) и referrals.inviter_id
+    if "walked_within_days" in segment:
+        conds.append(_walked_since(segment["walked_within_days"], today))
+    if "not_walked_within_days" in segment:
+        conds.append(~_walked_since(segment["not_walked_within_days"], today))
+    if "invited_by" in segment:
+        inviter = users.alias("inviter")
+        conds.append(
+            exists()
+            .select_from(referrals.join(inviter, inviter.c.id == referrals.c.inviter_id))
+            .where(
+                referrals.c.user_id == users.c.id,
+                inviter.c.telegram_id == segment["invited_by"],
+            )
+        )
+
+    # Границы дат включительно: сравниваем с началом следующего дня. Параметр
+    # передаётся как date, в timestamptz его приводит Postgres
+    if "registered_after" in segment:
+        conds.append(users.c.created_at >= literal(segment["registered_after"], Date))
+    if "registered_before" in segment:
+        conds.append(
+            users.c.created_at < literal(segment["registered_before"] + dt.timedelta(days=1), Date)
+        )
+    return conds
+
+
+def recipients_query(raw: Any) -> Select:
+    """
+    SELECT users.id получателей сегмента.
+    """
+    return select(users.c.id).where(*segment_conditions(raw))
+
+
+def recipients_count_query(raw: Any) -> Select:
+    return select(func.count()).select_from(users).where(*segment_conditions(raw))
+
+
+def compile_sql(stmt: Select) -> Tuple[str, Dict[str, Any]]:
+    """
+    SQL в формате psycopg2 (%(name)s) и параметры — для выполнения вне SQLAlchemy.
+    """
+    compiled = stmt.compile(dialect=postgresql.dialect())
+    return str(compiled), dict(compiled.params)
@@ -1,17 +1,102 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
 from sqlalchemy import select
 
 from app.steps_bot.db.models.captions import BotSetting
 from app.steps_bot.db.repo import get_session
+from app.steps_bot.services.invalidation_bus import invalidation_bus
+
+logger = logging.getLogger(__name__)
+
+# Страховочный срок жизни снимка на случай потерянного уведомления
+SETTINGS_TTL_SECONDS = 5 * 60
+
+
+class _Snapshot:
+    """
+    Копия таблицы bot_settings. version растёт при каждой перезагрузке или записи.
+    dirty — событие пришло во время идущей перезагрузки, и её надо повторить:
+    она могла прочитать таблицу до изменения.
+    """
+    __slots__ = ("values", "version", "loaded_at", "stale", "dirty", "reload_task")
+
+    def __init__(self) -> None:
+        self.values: Dict[str, str] = {}
+        self.version = 0
+        self.loaded_at: Optional[float] = None
+        self.stale = True
+        self.dirty = False
+        self.reload_task: Optional[asyncio.Task] = None
+
+
+_snapshot = _Snapshot()
 
 
 class SettingsService:
     @staticmethod
-    async def get_setting(key: str) -> str | None:
+    async def load() -> None:
+        """
+        Перечитывает все настройки одним запросом.
+        """
         async with get_session() as session:
-            result = await session.execute(
-                select(BotSetting.value).where(BotSetting.key == key)
-            )
-            return result.scalar_one_or_none()
+            rows = (await session.execute(select(BotSetting.key, BotSetting.value))).all()
+        _snapshot.values = {key: value for key, value in rows}
+        _snapshot.version += 1
+        _snapshot.loaded_at = time.monotonic()
+        _snapshot.stale = False
+
+    @staticmethod
+    async def open() -> None:
+        try:
+            await SettingsService.load()
+        except Exception as e:
+            logger.error("bot settings load failed: %s", e)
+
+    @staticmethod
+    def version() -> int:
+        return _snapshot.version
+
+    @staticmethod
+    def get(key: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        Синхронное чтение из снимка; до первой загрузки возвращает default.
+        """
+        return _snapshot.values.get(key, default)
+
+    @staticmethod
+    def get_int(key: str, default: int) -> int:
+        raw = _snapshot.values.get(key)
+        if not raw:
+            return default
+        try:
+            return int(raw)
+        except ValueError:
+            logger.warning("Invalid integer setting %s=%r, using default", key, raw)
+            return default
+
+    @staticmethod
+    async def ensure_fresh() -> None:
+        """
+        Перечитывает устаревший снимок одной задачей на процесс. Пока она идёт,
+        вызывающие читают прежний снимок; ждут её только до первой загрузки.
+        """
+        loaded_at = _snapshot.loaded_at
+        if not _snapshot.stale and loaded_at is not None and time.monotonic() - loaded_at <= SETTINGS_TTL_SECONDS:
+            return
+        task = _snapshot.reload_task
+        if task is None or task.done():
+            task = _snapshot.reload_task = asyncio.create_task(_reload_quietly())
+        if loaded_at is None:
+            # shield: отмена одного ожидающего не должна отменять общую загрузку
+            await asyncio.shield(task)
+
+    @staticmethod
+    async def get_setting(key: str) -> str | None:
+        await SettingsService.ensure_fresh()
+        return _snapshot.values.get(key)
 
     @staticmethod
     async def set_setting(key: str, value: str) -> None:
@@ -21,3 +106,32 @@ class SettingsService:
                 setting.value = value
             else:
                 session.add(BotSetting(key=key, value=value))
+        _snapshot.values[key] = value
+        _snapshot.version += 1
+        await invalidation_bus.publish("bot_settings", key)
+
+    @staticmethod
+    def invalidate(key: Optional[str] = None) -> None:
+        """
+        Помечает снимок устаревшим и перечитывает его в фоне.
+        """
+        _snapshot.stale = True
+        _snapshot.dirty = True
+        task = _snapshot.reload_task
+        if task is None or task.done():
+            _snapshot.reload_task = asyncio.create_task(_reload_quietly())
+
+
+async def _reload_quietly() -> None:
+    while True:
+        _snapshot.dirty = False
+        try:
+            await SettingsService.load()
+        except Exception as e:
+            logger.error("bot settings reload failed: %s", e)
+            return
+        if not _snapshot.dirty:
+            return
+
+
+invalidation_bus.subscribe("bot_settings", SettingsService.invalidate)
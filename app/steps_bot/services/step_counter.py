@@ -1,3 +1,8 @@
+from __future__ import annotations
+
+import math
+from typing import NamedTuple
+
 from geopy.distance import geodesic
 
 STEP_LENGTH = 0.75  # метра
@@ -5,18 +10,66 @@ MIN_DISTANCE = 5.5
 MAX_DISTANCE = 50
 MAX_SPEED = 8  # км/ч
 
+# Параметры эллипсоида WGS-84
+_WGS84_A = 6378137.0
+_WGS84_E2 = 6.69437999014e-3
+
+# До этого расстояния локальная плоская аппроксимация отличается от геодезической
+# меньше чем на миллиметр; дальше считаем точно через geopy.
+FAST_PATH_MAX_M = 1000.0
+
+
+class LocationSample(NamedTuple):
+    """
+    Результат оценки одного live-обновления геолокации.
+    """
+    distance_m: float
+    speed_kmh: float
+    too_fast: bool
+    steps: int
+
+
+def _fast_distance_m(prev: tuple[float, float], curr: tuple[float, float]) -> float:
+    """
+    Равнопромежуточная аппроксимация на эллипсоиде: радиусы кривизны меридиана
+    и первого вертикала берутся в средней широте отрезка.
+    """
+    mean_lat = math.radians((prev[0] + curr[0]) * 0.5)
+    sin_lat = math.sin(mean_lat)
+    w2 = 1.0 - _WGS84_E2 * sin_lat * sin_lat
+    w = math.sqrt(w2)
+    n = _WGS84_A / w
+    m = n * (1.0 - _WGS84_E2) / w2
+
+    d_lat = math.radians(curr[0] - prev[0])
+    d_lon = math.radians(curr[1] - prev[1])
+    if d_lon > math.pi:
+        d_lon -= 2 * math.pi
+    elif d_lon < -math.pi:
+        d_lon += 2 * math.pi
+
+    dy = m * d_lat
+    dx = n * math.cos(mean_lat) * d_lon
+    return math.hypot(dx, dy)
+
 
 def calculate_distance_m(prev: tuple[float, float], curr: tuple[float, float]) -> float:
+    distance = _fast_distance_m(prev, curr)
+    if distance <= FAST_PATH_MAX_M:
+        return distance
     return geodesic(prev, curr).meters
 
 
-def calculate_steps(prev: tuple[float, float], curr: tuple[float, float]) -> int:
-    distance = calculate_distance_m(prev, curr)
+def steps_for_distance(distance: float) -> int:
     if MIN_DISTANCE <= distance <= MAX_DISTANCE:
         return int(distance / STEP_LENGTH)
     return 0
 
 
+def calculate_steps(prev: tuple[float, float], curr: tuple[float, float]) -> int:
+    return steps_for_distance(calculate_distance_m(prev, curr))
+
+
 def is_too_fast(prev_coords: tuple[float, float], curr_coords: tuple[float, float], prev_ts: float, curr_ts: float) -> bool:
     delta_t = curr_ts - prev_ts
     if delta_t <= 0:
@@ -24,3 +77,23 @@ def is_too_fast(prev_coords: tuple[float, float], curr_coords: tuple[float, floa
     distance = calculate_distance_m(prev_coords, curr_coords)
     speed_kmh = (distance / delta_t) * 3.6
     return speed_kmh > MAX_SPEED
+
+
+def evaluate_sample(
+    prev_coords: tuple[float, float],
+    prev_ts: float,
+    curr_coords: tuple[float, float],
+    curr_ts: float,
+) -> LocationSample:
+    """
+    Считает расстояние, скорость, признак превышения скорости и шаги за один проход.
+    """
+    distance = calculate_distance_m(prev_coords, curr_coords)
+    delta_t = curr_ts - prev_ts
+    if delta_t <= 0:
+        return LocationSample(distance, 0.0, True, 0)
+
+    speed_kmh = (distance / delta_t) * 3.6
+    if speed_kmh > MAX_SPEED:
+        return LocationSample(distance, speed_kmh, True, 0)
+    return LocationSample(distance, speed_kmh, False, steps_for_distance(distance))
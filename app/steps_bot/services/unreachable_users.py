@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import logging
+from typing import Iterable, Set
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import select, update
+
+from app.steps_bot.db.models.user import User
+from app.steps_bot.db.repo import get_session
+
+logger = logging.getLogger(__name__)
+
+# Сколько telegram_id обновлять одним UPDATE
+DEACTIVATE_CHUNK_SIZE = 1000
+
+# Ответы Telegram, после которых писать пользователю бесполезно
+_UNREACHABLE_MARKERS = (
+    "chat not found",
+    "user is deactivated",
+    "bot was blocked",
+    "bot was kicked",
+    "peer_id_invalid",
+    "user not found",
+)
+
+
+def is_unreachable(exc: BaseException) -> bool:
+    """
+    Пользователь заблокировал бота, удалил аккаунт или чат не существует.
+    """
+    if isinstance(exc, TelegramForbiddenError):
+        return True
+    if isinstance(exc, TelegramBadRequest):
+        text = str(exc).lower()
+        return any(marker in text for marker in _UNREACHABLE_MARKERS)
+    return False
+
+
+async def set_users_active(telegram_ids: Iterable[int], active: bool) -> int:
+    """
+    Меняет users.is_active пачками по DEACTIVATE_CHUNK_SIZE. Возвращает число обновлённых строк.
+    """
+    ids = list(dict.fromkeys(telegram_ids))
+    updated = 0
+    for i in range(0, len(ids), DEACTIVATE_CHUNK_SIZE):
+        chunk = ids[i:i + DEACTIVATE_CHUNK_SIZE]
+        async with get_session() as session:
+            result = await session.execute(
+                update(User)
+                .where(User.telegram_id.in_(chunk), User.is_active.is_(not active))
+                .values(is_active=active)
+            )
+            updated += result.rowcount or 0
+    return updated
+
+
+async def inactive_among(telegram_ids: Iterable[int]) -> Set[int]:
+    """
+    Кого из переданных пользователей уже выключили как недоступных (users.is_active = false).
+    """
+    ids = list(dict.fromkeys(telegram_ids))
+    if not ids:
+        return set()
+    async with get_session() as session:
+        rows = await session.scalars(
+            select(User.telegram_id).where(User.telegram_id.in_(ids), User.is_active.is_(False))
+        )
+        return set(rows)
+
+
+class UnreachableUsers:
+    """
+    Копит недоступных пользователей во время отправки и выключает их пачкой,
+    чтобы следующие рассылки их не выбирали.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Set[int] = set()
+        self.seen = 0
+        self.deactivated = 0
+
+    def check(self, telegram_id: int, exc: BaseException) -> bool:
+        """
+        Запоминает пользователя, если ошибка означает, что он недоступен.
+        """
+        if not is_unreachable(exc):
+            return False
+        self.seen += 1
+        self._pending.add(telegram_id)
+        return True
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, set()
+        try:
+            updated = await set_users_active(pending, False)
+        except Exception:
+            self._pending |= pending
+            raise
+        self.deactivated += updated
+        return updated
@@ -1,8 +1,8 @@
 from typing import Optional
-from sqlalchemy import select
 
-from app.steps_bot.db.repo import get_session
+from app.steps_bot.db.repo import get_session, get_user_by_telegram
 from app.steps_bot.db.models.user import User
+from app.steps_bot.storage.user_ids import user_ids
 
 
 async def register_user(
@@ -12,7 +12,7 @@ async def register_user(
     email: str,
 ) -> User:
     async with get_session() as session:
-        user = await session.scalar(select(User).where(User.telegram_id == telegram_id))
+        user = await get_user_by_telegram(session, telegram_id)
 
         if user:
             if phone and not user.phone:
@@ -29,12 +29,13 @@ async def register_user(
             session.add(user)
 
         await session.flush()
+        user_ids.remember(telegram_id, user.id)
         return user
 
 
 async def get_user(telegram_id: int) -> Optional[User]:
     async with get_session() as session:
-        return await session.scalar(select(User).where(User.telegram_id == telegram_id))
+        return await get_user_by_telegram(session, telegram_id)
     
 
 async def sync_username(telegram_id: int, new_username: Optional[str]) -> None:
@@ -45,9 +46,7 @@ async def sync_username(telegram_id: int, new_username: Optional[str]) -> None:
         return
 
     async with get_session() as session:
-        user = await session.scalar(
-            select(User).where(User.telegram_id == telegram_id)
-        )
+        user = await get_user_by_telegram(session, telegram_id)
         if user and user.username != new_username:
             user.username = new_username
             await session.flush()
\ No newline at end of file
@@ -0,0 +1,288 @@
+from __future__ import annotations
+
+import datetime as dt
+import logging
+from typing import NamedTuple, Optional
+
+from sqlalchemy import text
+
+from app.steps_bot.db.session import engine
+from app.steps_bot.services.referral_service import get_referral_reward_percent
+from app.steps_bot.storage.user_ids import TelegramId, UserId, user_ids
+
+logger = logging.getLogger(__name__)
+
+WALK_TITLE = "Начисление за прогулку"
+REFERRAL_TITLE = "Реферальное начисление"
+# Описание проводки; подстановки %s — шаги и коэффициент (так же понимает format() в Postgres)
+WALK_DESCRIPTION = "Шаги: %s, коэффициент: ×%s"
+
+# Одиночный оператор атомарен сам по себе: выполняем его без BEGIN/COMMIT,
+# и завершение прогулки укладывается в один запрос к БД
+_autocommit_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+
+# Всё начисление за прогулку одним оператором с data-modifying CTE.
+# Порядок блокировок как у покупок: сначала семьи, потом пользователи.
+# fam_lock явно блокирует семьи по возрастанию id; usr соединяется с
+# однострочной сводкой family_locks, поэтому Postgres блокирует строку users
+# только после того, как fam_lock выполнен целиком. Если пригласивший
+# в той же семье, что и реферал, семья обновляется одной строкой с суммой,
+# а balance_after проводок восстанавливается в прежнем порядке: прогулка, затем реферальное.
+# С require_checkpoint начисление зависит от удаления контрольной точки (walk):
+# из нескольких процессов, завершающих одну прогулку, начислит только тот,
+# чей DELETE удалил строку active_walks, — её владелец (owner). Шаги
+# и коэффициент берутся из удалённой строки, а не из памяти вызывающего.
+# С idle_deadline (автозавершение) удаляется только простаивающая и по общей
+# контрольной точке прогулка.
+_ACCRUE_WALK_SQL = text("""
+WITH args AS (
+    SELECT
+        CAST(:telegram_id AS bigint) AS telegram_id,
+        CAST(:steps AS integer) AS steps,
+        CAST(:multiplier AS integer) AS multiplier,
+        CAST(:points AS integer) AS points,
+        CAST(:percent AS integer) AS percent,
+        CAST(:now AS timestamptz) AS now,
+        CAST(:day AS date) AS day,
+        CAST(:title AS varchar) AS title,
+        CAST(:description AS text) AS description,
+        CAST(:walk_description AS text) AS walk_description,
+        CAST(:referral_title AS varchar) AS referral_title,
+        CAST(:require_checkpoint AS boolean) AS require_checkpoint,
+        CAST(:idle_deadline AS double precision) AS idle_deadline,
+        CAST(:owner AS varchar) AS owner
+),
+walk AS (
+    DELETE FROM active_walks a
+    USING args
+    WHERE a.telegram_id = args.telegram_id
+      AND (args.owner IS NULL OR a.owner = args.owner)
+      AND (
+          args.idle_deadline IS NULL
+          OR a.last_update_at < args.idle_deadline
+          OR a.live_until <= extract(epoch FROM args.now)
+      )
+    RETURNING a.telegram_id, a.steps, a.multiplier
+),
+p AS (
+    SELECT
+        args.telegram_id,
+        COALESCE(w.steps, args.steps) AS steps,
+        COALESCE(w.multiplier, args.multiplier) AS multiplier,
+        GREATEST(COALESCE(w.steps * w.multiplier, args.points), 0) AS points,
+        args.percent,
+        args.now,
+        args.day,
+        args.title,
+        COALESCE(
+            args.description,
+            format(args.walk_description, COALESCE(w.steps, args.steps), COALESCE(w.multiplier, args.multiplier))
+        ) AS description,
+        args.referral_title,
+        args.require_checkpoint,
+        w.telegram_id IS NOT NULL AS had_checkpoint
+    FROM args
+    LEFT JOIN walk w ON true
+),
+target AS (
+    SELECT u.id, u.family_id, u.username, u.telegram_id
+    FROM users u
+    CROSS JOIN p
+    WHERE u.telegram_id = p.telegram_id
+      AND (p.had_checkpoint OR NOT p.require_checkpoint)
+),
+reward AS (
+    SELECT
+        r.id AS referral_id,
+        i.id AS inviter_id,
+        i.family_id AS inviter_family_id,
+        p.points * p.percent / 100 AS amount,
+        'Вознаграждение ' || p.percent || '% от заработка реферала @'
+            || COALESCE(t.username, t.telegram_id::text) AS description
+    FROM target t
+    JOIN referrals r ON r.user_id = t.id
+    JOIN users i ON i.id = r.inviter_id
+    CROSS JOIN p
+    WHERE p.points * p.percent / 100 > 0
+),
+family_credit AS (
+    SELECT c.family_id, SUM(c.amount) AS amount
+    FROM (
+        SELECT t.family_id, p.points AS amount
+        FROM target t, p
+        WHERE t.family_id IS NOT NULL AND p.points > 0
+        UNION ALL
+        SELECT w.inviter_family_id, w.amount
+        FROM reward w
+        WHERE w.inviter_family_id IS NOT NULL
+    ) c
+    GROUP BY c.family_id
+),
+fam_lock AS (
+    SELECT f.id
+    FROM families f
+    WHERE f.id IN (SELECT family_id FROM family_credit)
+    ORDER BY f.id
+    FOR UPDATE
+),
+family_locks AS (
+    SELECT count(*) AS locked FROM fam_lock
+),
+fam AS (
+    UPDATE families f
+    SET balance = f.balance + c.amount
+    FROM family_credit c
+    JOIN fam_lock l ON l.id = c.family_id
+    WHERE f.id = c.family_id
+    RETURNING f.id, f.balance
+),
+user_credit AS (
+    SELECT t.id, p.steps, CASE WHEN t.family_id IS NULL AND p.points > 0 THEN p.points ELSE 0 END AS amount
+    FROM target t, p
+    UNION ALL
+    SELECT w.inviter_id, 0, w.amount
+    FROM reward w
+    WHERE w.inviter_family_id IS NULL
+),
+usr AS (
+    UPDATE users u
+    SET step_count = u.step_count + c.steps,
+        balance = u.balance + c.amount,
+        updated_at = p.now
+    FROM user_credit c, p, family_locks
+    WHERE u.id = c.id
+    RETURNING u.id, u.balance
+),
+ref AS (
+    UPDATE referrals r
+    SET reward_points = r.reward_points + w.amount
+    FROM reward w
+    WHERE r.id = w.referral_id
+    RETURNING r.id
+),
+ledger AS (
+    INSERT INTO ledger_entries
+        (owner_type, family_id, user_id, operation, amount, balance_after, title, description, created_at)
+    SELECT CAST('user' AS ownertype), NULL, t.id, CAST('steps_accrual' AS operationtype), p.points,
+           CASE WHEN t.family_id IS NULL THEN u.balance END, p.title, p.description, p.now
+    FROM target t JOIN usr u ON u.id = t.id CROSS JOIN p
+    WHERE p.points > 0
+    UNION ALL
+    SELECT CAST('family' AS ownertype), t.family_id, NULL, CAST('steps_accrual' AS operationtype), p.points,
+           f.balance - COALESCE((SELECT w.amount FROM reward w WHERE w.inviter_family_id = t.family_id), 0),
+           p.title, p.description, p.now
+    FROM target t JOIN fam f ON f.id = t.family_id CROSS JOIN p
+    WHERE p.points > 0
+    UNION ALL
+    SELECT CAST('family' AS ownertype), w.inviter_family_id, NULL, CAST('promo_accrual' AS operationtype), w.amount,
+           f.balance, p.referral_title, w.description, p.now
+    FROM reward w JOIN fam f ON f.id = w.inviter_family_id CROSS JOIN p
+    UNION ALL
+    SELECT CAST('user' AS ownertype), NULL, w.inviter_id, CAST('promo_accrual' AS operationtype), w.amount,
+           u.balance, p.referral_title, w.description, p.now
+    FROM reward w JOIN usr u ON u.id = w.inviter_id CROSS JOIN p
+    WHERE w.inviter_family_id IS NULL
+    RETURNING id
+),
+daily AS (
+    INSERT INTO daily_step_usage (user_id, day, steps_used, updated_at)
+    SELECT t.id, p.day, p.steps, p.now
+    FROM target t, p
+    WHERE p.steps > 0
+    ON CONFLICT (user_id, day) DO UPDATE
+    SET steps_used = daily_step_usage.steps_used + EXCLUDED.steps_used,
+        updated_at = EXCLUDED.updated_at
+    RETURNING steps_used
+)
+SELECT
+    (SELECT id FROM target) AS user_id,
+    (SELECT steps_used FROM daily) AS used_today,
+    (SELECT COALESCE(SUM(amount), 0) FROM reward) AS referral_reward,
+    (SELECT count(*) FROM ledger) AS ledger_entries,
+    p.had_checkpoint,
+    p.steps,
+    p.multiplier,
+    p.points
+FROM p
+""")
+
+
+class WalkAccrual(NamedTuple):
+    """
+    Итог начисления за прогулку.
+    """
+    user_id: Optional[UserId]
+    used_today: Optional[int]
+    referral_reward: int
+    ledger_entries: int
+    # False, если прогулку уже завершил и начислил другой процесс
+    credited: bool = True
+    # Начисленное: из контрольной точки прогулки, если она была, иначе переданное
+    steps: int = 0
+    multiplier: int = 1
+    points: int = 0
+
+
+async def accrue_walk(
+    telegram_id: TelegramId,
+    steps: int,
+    points: int,
+    multiplier: int = 1,
+    description: Optional[str] = None,
+    finished_at: Optional[dt.datetime] = None,
+    day: Optional[dt.date] = None,
+    require_checkpoint: bool = False,
+    idle_deadline: Optional[float] = None,
+    owner: Optional[str] = None,
+) -> WalkAccrual:
+    """
+    Начисляет баллы за прогулку (в семью или лично), пишет проводки, прибавляет
+    step_count и дневной счётчик, начисляет процент пригласившему и удаляет
+    контрольную точку прогулки — одним запросом и одной неявной транзакцией.
+
+    Удалённая контрольная точка задаёт шаги, коэффициент и баллы; steps,
+    multiplier и points вызывающего начисляются, только если точки нет.
+    description по умолчанию — WALK_DESCRIPTION.
+
+    require_checkpoint=True — начислять, только если этот вызов удалил
+    контрольную точку из active_walks (общее хранилище прогулок);
+    owner — удалять только точку этого процесса-владельца;
+    idle_deadline — вдобавок точка должна простаивать с этого момента (unix time)
+    или её трансляция геолокации должна закончиться.
+    """
+    # Баллы из контрольной точки заранее неизвестны
+    percent = await get_referral_reward_percent() if points > 0 or require_checkpoint else 0
+    params = {
+        "telegram_id": telegram_id,
+        "steps": int(steps),
+        "multiplier": int(multiplier),
+        "points": max(int(points), 0),
+        "percent": int(percent),
+        "now": finished_at or dt.datetime.now(dt.timezone.utc),
+        "day": day or dt.date.today(),
+        "title": WALK_TITLE,
+        "description": description,
+        "walk_description": WALK_DESCRIPTION,
+        "referral_title": REFERRAL_TITLE,
+        "require_checkpoint": require_checkpoint,
+        "idle_deadline": idle_deadline,
+        "owner": owner,
+    }
+    async with _autocommit_engine.connect() as conn:
+        row = (await conn.execute(_ACCRUE_WALK_SQL, params)).one()
+
+    if row.user_id is None and require_checkpoint and not row.had_checkpoint:
+        logger.info("walk accrual: walk of %s already finished by another process", telegram_id)
+        return WalkAccrual(None, None, 0, 0, credited=False)
+    credited = {"steps": int(row.steps), "multiplier": int(row.multiplier), "points": int(row.points)}
+    if row.user_id is None:
+        logger.warning("walk accrual: user %s not found", telegram_id)
+        return WalkAccrual(None, None, 0, 0, **credited)
+    user_id = UserId(row.user_id)
+    user_ids.remember(telegram_id, user_id)
+    if row.referral_reward:
+        logger.info(
+            "Referral reward: referral=%s earned=%s reward=%s (%s%%)",
+            telegram_id, row.points, row.referral_reward, percent,
+        )
+    return WalkAccrual(user_id, row.used_today, int(row.referral_reward), int(row.ledger_entries), **credited)
@@ -3,27 +3,17 @@ from __future__ import annotations
 import logging
 import datetime as dt
 
+from aiogram import Bot
 from aiogram.types import Message
-from aiogram.exceptions import TelegramBadRequest
-from sqlalchemy import select, text, update
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 
-from app.steps_bot.db.repo import get_session
 from app.steps_bot.db.models.walk import WalkForm
-from app.steps_bot.db.models.user import User
 from app.steps_bot.presentation.keyboards.simple_kb import back_kb
-from app.steps_bot.storage.user_memory import (
-    user_walk_multiplier,
-    user_walk_form,
-    user_walk_started_at,
-    user_steps,
-    user_coords,
-    user_was_over_speed,
-    user_msg_id,
-    user_walk_finished,
-    user_daily_steps_used,
-    user_daily_steps_date,
-)
-from app.steps_bot.services.ledger_service import accrue_steps_points
+from app.steps_bot.storage.user_memory import WalkSession, walk_registry
+from app.steps_bot.services.walk_accrual import accrue_walk
+from app.steps_bot.services.edit_coalescer import walk_status_editor
+from app.steps_bot.services.unreachable_users import is_unreachable, set_users_active
+from app.steps_bot.services.daily_steps_service import publish_used_steps
 
 logger = logging.getLogger(__name__)
 
@@ -33,9 +23,10 @@ async def finish_walk(
     *,
     target_message_id: int | None = None,
     user_id: int | None = None,
-) -> None:
+) -> bool:
     """
     Завершает прогулку: фиксирует шаги, начисляет баллы в журнал и обновляет счётчик шагов.
+    Возвращает False, если активной прогулки уже нет (например, её завершил параллельный запрос).
     """
     uid = (
         user_id
@@ -43,80 +34,157 @@ async def finish_walk(
         else (message.from_user.id if message.from_user and not message.from_user.is_bot else message.chat.id)
     )
 
-    user_walk_finished[uid] = True
+    # Прогулку, которую ведёт другой процесс бота, сначала забираем себе
+    if await walk_registry.get_or_load(uid) is None:
+        return False
+    session = walk_registry.finish(uid)
+    if session is None:
+        return False
+    credited = await _credit_walk(uid, session)
+    if credited is None:
+        walk_status_editor.forget(session.chat_id)
+        return False
+    total_steps, multiplier, points = credited
+
+    msg_id = target_message_id or session.message_id
+    await _send_summary(
+        message.bot,
+        message.chat.id,
+        msg_id,
+        _summary_text(total_steps, multiplier, points),
+    )
+    return True
+
+
+async def finish_abandoned_walk(
+    bot: Bot,
+    session: WalkSession,
+    reason: str,
+    idle_deadline: float | None = None,
+    notify: bool = True,
+) -> bool:
+    """
+    Завершает прогулку без входящего сообщения (трансляция геолокации закончилась
+    или пользователь пропал). Возвращает False, если прогулка уже завершена,
+    в том числе другим процессом бота с общим хранилищем прогулок.
+    idle_deadline — порог простоя, который должна пройти и общая контрольная
+    точка: прогулку, которую ведёт другая реплика, эта реплика просто забывает.
+    notify=False — начислить без итогового сообщения (пользователь недоступен).
+    """
+    uid = session.telegram_id
+    if walk_registry.get(uid) is not session:
+        return False
+    walk_registry.finish(uid)
+    credited = await _credit_walk(uid, session, idle_deadline)
+    if credited is None:
+        walk_status_editor.forget(session.chat_id)
+        return False
+    total_steps, multiplier, points = credited
+    if not notify:
+        walk_status_editor.forget(session.chat_id)
+        return True
+    await _send_summary(
+        bot,
+        session.chat_id,
+        session.message_id,
+        f"{_summary_text(total_steps, multiplier, points)}\n\n{reason}",
+    )
+    return True
 
-    total_steps = int(user_steps.get(uid, 0))
-    multiplier = int(user_walk_multiplier.get(uid, 1))
-    _walk_form = user_walk_form.get(uid, WalkForm.DOG)
+
+async def _credit_walk(
+    uid: int,
+    session: WalkSession | None,
+    idle_deadline: float | None = None,
+) -> tuple[int, int, int] | None:
+    """
+    Начисляет баллы за прогулку и обновляет счётчики шагов. Возвращает начисленные
+    (шаги, множитель, баллы) или None, если прогулку уже начислил другой процесс
+    (итог он же и отправил).
+    """
+    total_steps = int(session.steps) if session else 0
+    multiplier = int(session.multiplier) if session else 1
+    _walk_form = session.form if session else WalkForm.DOG
     points = int(total_steps * multiplier)
 
     finished_at = dt.datetime.now(dt.timezone.utc)
-    started_ts = user_walk_started_at.get(uid)
+    started_ts = session.started_at if session else None
     _started_at = (
         dt.datetime.fromtimestamp(started_ts, tz=dt.timezone.utc)
         if started_ts is not None else finished_at
     )
 
     try:
-        async with get_session() as s:
-            await accrue_steps_points(
-                session=s,
-                user_id_or_telegram=uid,
-                amount=points,
-                title="Начисление за прогулку",
-                description=f"Шаги: {total_steps}, коэффициент: ×{multiplier}",
-            )
-
-            upd_steps = (
-                update(User)
-                .where((User.telegram_id == uid) | (User.id == uid))
-                .values(
-                    step_count=User.step_count + total_steps,
-                    updated_at=finished_at,
-                )
-            )
-            await s.execute(upd_steps)
+        # Начисление, step_count, дневной лимит, реферальный процент и удаление
+        # контрольной точки прогулки (active_walks) — одним оператором
+        require_checkpoint = await walk_registry.store.settle(session) if session else False
+        accrual = await accrue_walk(
+            uid,
+            steps=total_steps,
+            points=points,
+            multiplier=multiplier,
+            finished_at=finished_at,
+            require_checkpoint=require_checkpoint,
+            idle_deadline=idle_deadline,
+            owner=walk_registry.store.owner,
+        )
+        if not accrual.credited:
+            return None
+        total_steps, multiplier, points = accrual.steps, accrual.multiplier, accrual.points
+        if accrual.used_today is not None:
+            await publish_used_steps(uid)
 
     except Exception as e:
         logger.exception("Failed to finalize walk for %s: %s", uid, e)
 
-    # Обновляем дневной использованный лимит
-    try:
-        today = dt.date.today().isoformat()
-        if user_daily_steps_date.get(uid) != today:
-            user_daily_steps_date[uid] = today
-            user_daily_steps_used[uid] = 0
-        user_daily_steps_used[uid] = int(user_daily_steps_used.get(uid, 0)) + total_steps
-    except Exception:
-        pass
-
-    summary_text = (
+    return total_steps, multiplier, points
+
+
+def _summary_text(total_steps: int, multiplier: int, points: int) -> str:
+    return (
         "🏁 Прогулка завершена!\n\n"
         f"Итого шагов: {total_steps}\n"
         f"Начислено баллов: {points} (коэфф: ×{multiplier})"
     )
 
-    msg_id = target_message_id or user_msg_id.get(uid, {}).get("message_id")
+
+async def _send_summary(bot: Bot, chat_id: int, msg_id: int | None, summary_text: str) -> None:
+    """
+    Заменяет статус прогулки итогом, а если это невозможно — отправляет итог новым сообщением.
+    """
     try:
         if msg_id:
-            await message.bot.edit_message_text(
-                chat_id=message.chat.id,
-                message_id=msg_id,
-                text=summary_text,
+            await walk_status_editor.finalize(
+                bot,
+                chat_id,
+                msg_id,
+                summary_text,
                 reply_markup=back_kb,
             )
         else:
-            await message.answer(summary_text, reply_markup=back_kb)
+            walk_status_editor.forget(chat_id)
+            await bot.send_message(chat_id, summary_text, reply_markup=back_kb)
+    except TelegramForbiddenError:
+        await _deactivate(chat_id)
     except TelegramBadRequest as e:
+        if is_unreachable(e):
+            await _deactivate(chat_id)
+            return
         logger.warning("finish_walk edit failed: %s", e)
         try:
-            await message.answer(summary_text, reply_markup=back_kb)
+            await bot.send_message(chat_id, summary_text, reply_markup=back_kb)
         except Exception as e2:
+            if is_unreachable(e2):
+                await _deactivate(chat_id)
+                return
             logger.exception("Fallback answer failed: %s", e2)
 
-    user_coords.pop(uid, None)
-    user_was_over_speed.pop(uid, None)
-    user_walk_multiplier.pop(uid, None)
-    user_walk_form.pop(uid, None)
-    user_walk_started_at.pop(uid, None)
-    user_steps.pop(uid, None)
+
+async def _deactivate(chat_id: int) -> None:
+    """
+    Пользователь недоступен (заблокировал бота): исключаем его из рассылок.
+    """
+    try:
+        await set_users_active([chat_id], False)
+    except Exception as e:
+        logger.warning("Failed to deactivate unreachable user %s: %s", chat_id, e)
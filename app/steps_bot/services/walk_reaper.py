@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from aiogram import Bot
+
+from app.steps_bot.services.unreachable_users import inactive_among
+from app.steps_bot.services.walk_finish import finish_abandoned_walk
+from app.steps_bot.settings import config
+from app.steps_bot.storage.user_memory import walk_registry
+
+logger = logging.getLogger(__name__)
+
+REAPER_BATCH_SIZE = 50
+
+EXPIRED_REASON = "📍 Трансляция геолокации завершилась, поэтому прогулка закончена автоматически."
+IDLE_REASON = "📍 Давно не было обновлений геолокации, поэтому прогулка закончена автоматически."
+
+
+async def run_walk_reaper_once(bot: Bot) -> Dict[str, int]:
+    """
+    Автоматически завершает брошенные прогулки пачками и возвращает отчёт:
+    сколько прогулок завершено и сколько памяти реестра освобождено.
+    Недоступным пользователям (is_active = false) прогулка начисляется без
+    итогового сообщения: Telegram его всё равно не доставит.
+    """
+    now = time.time()
+    idle_deadline = now - config.WALK_IDLE_FINISH_SECONDS
+    expired = walk_registry.expired(now, config.WALK_IDLE_FINISH_SECONDS)
+    try:
+        # Брошенные прогулки остановленных процессов и вытесненные из памяти
+        expired += await walk_registry.adopt_expired(now, config.WALK_IDLE_FINISH_SECONDS)
+    except Exception as e:
+        logger.warning("walk reaper: failed to adopt expired walks: %s", e)
+    if not expired:
+        return {"reaped": 0, "freed_bytes": 0, "silent": 0}
+
+    before = walk_registry.memory_report()
+    reaped = 0
+    silent = 0
+    for i in range(0, len(expired), REAPER_BATCH_SIZE):
+        batch = expired[i:i + REAPER_BATCH_SIZE]
+        try:
+            inactive = await inactive_among(s.telegram_id for s in batch)
+        except Exception as e:
+            logger.warning("walk reaper: failed to check inactive users: %s", e)
+            inactive = set()
+        results = await asyncio.gather(
+            *(
+                finish_abandoned_walk(
+                    bot,
+                    s,
+                    EXPIRED_REASON if s.live_until is not None and s.live_until <= now else IDLE_REASON,
+                    idle_deadline=idle_deadline,
+                    notify=s.telegram_id not in inactive,
+                )
+                for s in batch
+            ),
+            return_exceptions=True,
+        )
+        for session, result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.warning("walk reaper failed for %s: %s", session.telegram_id, result)
+            elif result:
+                reaped += 1
+                silent += session.telegram_id in inactive
+    after = walk_registry.memory_report()
+
+    freed = before["sessions_bytes"] - after["sessions_bytes"]
+    logger.info(
+        "walk reaper: finished %s abandoned walks (%s without summary), freed ~%s bytes, %s walks still active",
+        reaped,
+        silent,
+        freed,
+        after["sessions"],
+    )
+    return {"reaped": reaped, "freed_bytes": freed, "silent": silent}
+
+
+async def run_walk_reaper(bot: Bot) -> None:
+    """
+    Фоновая задача: раз в WALK_REAPER_INTERVAL_SECONDS завершает брошенные прогулки.
+    """
+    while True:
+        await asyncio.sleep(config.WALK_REAPER_INTERVAL_SECONDS)
+        try:
+            await run_walk_reaper_once(bot)
+        except Exception as e:
+            logger.error("walk reaper error: %s", e)
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import asyncio
+from typing import List
+
+from aiogram import Bot
+
+from app.steps_bot.services.walk_reaper import run_walk_reaper
+from app.steps_bot.services.walk_weather import run_walk_weather_refresh
+
+
+def start_walk_tasks(bot: Bot) -> List[asyncio.Task]:
+    """
+    Запускает фоновые задачи прогулок, общие для polling и вебхук-приложения:
+    автозавершение брошенных прогулок и обновление погоды активных.
+    """
+    return [
+        asyncio.create_task(run_walk_reaper(bot)),
+        asyncio.create_task(run_walk_weather_refresh()),
+    ]
+
+
+async def stop_walk_tasks(tasks: List[asyncio.Task]) -> None:
+    """
+    Останавливает задачи start_walk_tasks и дожидается их завершения.
+    """
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
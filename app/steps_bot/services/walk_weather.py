@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Dict
+
+from app.steps_bot.services.coefficients_service import coefficients
+from app.steps_bot.services.weather_service import weather_service
+from app.steps_bot.settings import config
+from app.steps_bot.storage.user_memory import walk_registry
+
+logger = logging.getLogger(__name__)
+
+
+async def run_walk_weather_refresh_once() -> Dict[str, int]:
+    """
+    Обновляет температуру и множитель всех активных прогулок. Прогулки
+    группируются по ячейкам сетки погоды, поэтому число запросов к API
+    зависит от числа ячеек, а не от числа гуляющих.
+    """
+    sessions = list(walk_registry)
+    if not sessions:
+        return {"walks": 0, "cells": 0, "updated": 0}
+
+    by_cell = {}
+    for session in sessions:
+        cell = weather_service.cell_of(*session.coords)
+        by_cell.setdefault(cell, []).append(session)
+
+    temps = await weather_service.refresh_cells(by_cell.keys())
+    await coefficients.ensure_loaded()
+
+    now = time.time()
+    updated = 0
+    for cell, cell_sessions in by_cell.items():
+        temp_c = temps.get(cell)
+        if temp_c is None:
+            continue
+        for session in cell_sessions:
+            session.temp_c = temp_c
+            session.temp_updated_at = now
+            session.multiplier = coefficients.total_multiplier(session.form, temp_c)
+            walk_registry.touch(session)
+            updated += 1
+
+    logger.debug(
+        "walk weather: %s walks in %s cells, %s updated, cache %s",
+        len(sessions),
+        len(by_cell),
+        updated,
+        weather_service.stats(),
+    )
+    return {"walks": len(sessions), "cells": len(by_cell), "updated": updated}
+
+
+async def run_walk_weather_refresh() -> None:
+    """
+    Фоновая задача: раз в WALK_WEATHER_REFRESH_SECONDS обновляет погоду активных прогулок.
+    """
+    while True:
+        await asyncio.sleep(config.WALK_WEATHER_REFRESH_SECONDS)
+        try:
+            await run_walk_weather_refresh_once()
+        except Exception as e:
+            logger.error("walk weather refresh error: %s", e)
@@ -1,31 +1,268 @@
 from __future__ import annotations
 
-from typing import Optional
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
 import httpx
 
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
 OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
 
-async def get_current_temp_c(lat: float, lon: float) -> Optional[int]:
+Cell = Tuple[int, int]
+
+# Предохранитель: после стольких неудач подряд запросы к API приостанавливаются
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_COOLDOWN_SECONDS = 60.0
+# Ответ дольше этого считается неудачей, даже если он успешный
+SLOW_FETCH_SECONDS = 2.0
+# Сколько координат передавать в одном запросе к Open-Meteo
+BATCH_SIZE = 50
+
+
+class WeatherService:
     """
-    Возвращает только текущую температуру в °C по координатам (Open-Meteo, без ключа).
+    Текущая температура по координатам с кэшем по ячейкам сетки.
+
+    Координаты округляются до ячейки размером cell_deg градусов, поэтому все
+    гуляющие в одном районе получают одно значение из кэша. Записи живут ttl
+    секунд, при превышении max_size вытесняется давно не использованная.
+    HTTP-клиент один на процесс и держит пул соединений.
+
+    Одновременные промахи по одной ячейке ждут один общий запрос. Если API
+    отвечает с ошибками или медленно, предохранитель на время перестаёт
+    ходить в сеть и отдаёт последнее известное значение ячейки. После паузы
+    он полуоткрыт: первый же неудачный запрос снова размыкает его, удачный —
+    замыкает.
     """
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "current_weather": "true",
-        "timezone": "auto",
-    }
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get(OPEN_METEO_URL, params=params)
+
+    def __init__(
+        self,
+        cell_deg: float,
+        ttl: float,
+        max_size: int,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ) -> None:
+        self.cell_deg = cell_deg
+        self.ttl = ttl
+        self.max_size = max_size
+        self._transport = transport
+        self._cache: "OrderedDict[Cell, Tuple[float, int]]" = OrderedDict()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[Cell, asyncio.Task] = {}
+        self._failures = 0
+        self._open_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_served = 0
+
+    async def open(self) -> None:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=5.0,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                transport=self._transport,
+            )
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def cell_of(self, lat: float, lon: float) -> Cell:
+        return (round(lat / self.cell_deg), round(lon / self.cell_deg))
+
+    def cell_center(self, cell: Cell) -> Tuple[float, float]:
+        return (cell[0] * self.cell_deg, cell[1] * self.cell_deg)
+
+    def cached(self, lat: float, lon: float) -> Optional[int]:
+        """
+        Возвращает свежее значение из кэша без обращения к сети.
+        """
+        return self._lookup(self.cell_of(lat, lon), time.monotonic())
+
+    async def get_temp_c(self, lat: float, lon: float) -> Optional[int]:
+        cell = self.cell_of(lat, lon)
+        now = time.monotonic()
+        temp = self._lookup(cell, now)
+        if temp is not None:
+            self.hits += 1
+            return temp
+        self.misses += 1
+
+        if now < self._open_until:
+            return self._stale(cell)
+
+        task = self._inflight.get(cell)
+        if task is None:
+            task = asyncio.create_task(self._refresh(cell))
+            self._inflight[cell] = task
+        else:
+            self.coalesced += 1
+        # shield: отмена одного ожидающего не должна отменять общий запрос
+        temp = await asyncio.shield(task)
+        return temp if temp is not None else self._stale(cell)
+
+    async def refresh_cells(self, cells: Iterable[Cell]) -> Dict[Cell, int]:
+        """
+        Обновляет температуру для набора ячеек пакетными запросами (несколько
+        координат через запятую) и возвращает значения для всех ячеек, по которым
+        есть данные: свежие из кэша, новые из API или, при отказе API, последние известные.
+        """
+        now = time.monotonic()
+        result: Dict[Cell, int] = {}
+        to_fetch: List[Cell] = []
+        for cell in dict.fromkeys(cells):
+            temp = self._lookup(cell, now)
+            if temp is not None:
+                self.hits += 1
+                result[cell] = temp
+            else:
+                self.misses += 1
+                to_fetch.append(cell)
+
+        for i in range(0, len(to_fetch), BATCH_SIZE):
+            chunk = to_fetch[i:i + BATCH_SIZE]
+            fetched: List[Optional[int]] = [None] * len(chunk)
+            if time.monotonic() >= self._open_until:
+                started = time.monotonic()
+                fetched = await self._fetch_many([self.cell_center(c) for c in chunk])
+                ok = any(t is not None for t in fetched)
+                self._record_result(ok=ok and time.monotonic() - started <= SLOW_FETCH_SECONDS)
+            for cell, temp in zip(chunk, fetched):
+                if temp is not None:
+                    self._store(cell, temp)
+                    result[cell] = temp
+                else:
+                    stale = self._stale(cell)
+                    if stale is not None:
+                        result[cell] = stale
+        return result
+
+    @property
+    def breaker_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stale_served": self.stale_served,
+            "size": len(self._cache),
+            "inflight": len(self._inflight),
+            "breaker_open": int(self.breaker_open),
+        }
+
+    def _lookup(self, cell: Cell, now: float) -> Optional[int]:
+        entry = self._cache.get(cell)
+        if entry is None:
+            return None
+        fetched_at, temp = entry
+        if now - fetched_at > self.ttl:
+            # Устаревшую запись не удаляем: она пригодится, если API недоступен
+            return None
+        self._cache.move_to_end(cell)
+        return temp
+
+    def _stale(self, cell: Cell) -> Optional[int]:
+        entry = self._cache.get(cell)
+        if entry is None:
+            return None
+        self.stale_served += 1
+        return entry[1]
+
+    async def _refresh(self, cell: Cell) -> Optional[int]:
+        started = time.monotonic()
+        try:
+            temp = await self._fetch(*self.cell_center(cell))
+        finally:
+            self._inflight.pop(cell, None)
+        elapsed = time.monotonic() - started
+        if temp is not None:
+            self._store(cell, temp)
+        self._record_result(ok=temp is not None and elapsed <= SLOW_FETCH_SECONDS)
+        return temp
+
+    def _record_result(self, ok: bool) -> None:
+        if ok:
+            self._failures = 0
+            return
+        self._failures += 1
+        if self._failures >= BREAKER_FAILURE_THRESHOLD:
+            self._open_until = time.monotonic() + BREAKER_COOLDOWN_SECONDS
+            # После паузы предохранитель полуоткрыт: хватит одной неудачи
+            self._failures = BREAKER_FAILURE_THRESHOLD - 1
+            logger.warning(
+                "weather API is failing, serving cached values for %.0f s",
+                BREAKER_COOLDOWN_SECONDS,
+            )
+
+    def _store(self, cell: Cell, temp: int) -> None:
+        self._cache[cell] = (time.monotonic(), temp)
+        self._cache.move_to_end(cell)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    async def _fetch(self, lat: float, lon: float) -> Optional[int]:
+        """
+        Запрашивает текущую температуру в °C у Open-Meteo (без ключа).
+        """
+        return (await self._fetch_many([(lat, lon)]))[0]
+
+    async def _fetch_many(self, points: List[Tuple[float, float]]) -> List[Optional[int]]:
+        """
+        Один запрос на несколько точек: Open-Meteo принимает списки координат
+        через запятую и возвращает массив ответов в том же порядке.
+        """
+        if self._client is None:
+            await self.open()
+        params = {
+            "latitude": ",".join(f"{lat:.4f}" for lat, _ in points),
+            "longitude": ",".join(f"{lon:.4f}" for _, lon in points),
+            "current_weather": "true",
+            "timezone": "auto",
+        }
+        empty: List[Optional[int]] = [None] * len(points)
+        try:
+            resp = await self._client.get(OPEN_METEO_URL, params=params)
             if resp.status_code != 200:
-                return None
+                return empty
             data = resp.json()
+        except (httpx.HTTPError, ValueError) as e:
+            logger.warning("weather fetch failed: %s", e)
+            return empty
 
-        cw = data.get("current_weather") or {}
-        temp = cw.get("temperature")
-        if temp is None:
-            return None
-        return int(round(float(temp)))
-    except (httpx.HTTPError, ValueError, KeyError):
+        items = data if isinstance(data, list) else [data]
+        if len(items) != len(points):
+            logger.warning("weather API returned %s results for %s points", len(items), len(points))
+            return empty
+        return [_parse_temp(item) for item in items]
+
+
+def _parse_temp(item: dict) -> Optional[int]:
+    try:
+        temp = (item.get("current_weather") or {}).get("temperature")
+        return None if temp is None else int(round(float(temp)))
+    except (AttributeError, TypeError, ValueError):
         return None
+
+
+weather_service = WeatherService(
+    cell_deg=config.WEATHER_CELL_DEG,
+    ttl=config.WEATHER_CACHE_TTL_SECONDS,
+    max_size=config.WEATHER_CACHE_MAX_SIZE,
+)
+
+
+async def get_current_temp_c(lat: float, lon: float) -> Optional[int]:
+    """
+    Возвращает только текущую температуру в °C по координатам.
+    """
+    return await weather_service.get_temp_c(lat, lon)
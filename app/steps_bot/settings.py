@@ -34,6 +34,39 @@ class Settings(BaseSettings):
     DEFAULT_PACKAGE_H: int = 10
 
     MEDIA_ROOT: str = "/app/media"
+    # Служебный чат, куда бот загружает медиа, чтобы получить telegram_file_id
+    MEDIA_STORAGE_CHAT_ID: Optional[int] = None
+    MEDIA_WARMUP_CONCURRENCY: int = 4
+
+    # Рассылки: общий темп отправки (лимит Telegram ~30 сообщений/с) и число воркеров
+    BROADCAST_RATE_PER_SECOND: float = 25.0
+    BROADCAST_WORKERS: int = 16
+    # Сколько доставок брать из журнала за раз
+    BROADCAST_CHUNK_SIZE: int = 500
+    # Аренда захваченной рассылки; продлевается каждую треть срока, пока идёт отправка
+    BROADCAST_LEASE_SECONDS: float = 120.0
+
+    # Хранилище активных прогулок: memory (только один процесс бота) | postgres
+    WALK_STATE_BACKEND: str = "memory"
+    WALK_CHECKPOINT_SECONDS: float = 5.0
+    # Не чаще одной правки статуса прогулки в чате за указанное число секунд
+    WALK_STATUS_EDIT_INTERVAL: float = 3.0
+    # Автозавершение брошенных прогулок
+    WALK_REAPER_INTERVAL_SECONDS: float = 60.0
+    WALK_IDLE_FINISH_SECONDS: float = 30 * 60
+
+    # Кэш погоды: размер ячейки сетки в градусах, время жизни записи и размер кэша
+    WEATHER_CELL_DEG: float = 0.1
+    WEATHER_CACHE_TTL_SECONDS: float = 10 * 60
+    WEATHER_CACHE_MAX_SIZE: int = 2048
+    # Как часто фоновая задача обновляет температуру активных прогулок
+    WALK_WEATHER_REFRESH_SECONDS: float = 180.0
+
+    # Как часто перечитывать снимок коэффициентов, даже если изменений не было
+    COEFFICIENTS_RELOAD_SECONDS: float = 5 * 60
+
+    # Сколько соответствий telegram_id → users.id держать в памяти
+    USER_ID_CACHE_SIZE: int = 100_000
     
     API_KEY: str
 
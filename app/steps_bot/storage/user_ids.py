@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import NewType, Optional
+
+from app.steps_bot.settings import config
+
+# Идентификатор пользователя в Telegram (users.telegram_id)
+TelegramId = NewType("TelegramId", int)
+# Первичный ключ пользователя в БД (users.id)
+UserId = NewType("UserId", int)
+
+
+class UserIdCache:
+    """
+    Ограниченный LRU-кэш telegram_id → users.id на весь процесс. users.id
+    у пользователя не меняется, поэтому записи не устаревают по времени.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._ids: OrderedDict[int, int] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def get(self, telegram_id: TelegramId) -> Optional[UserId]:
+        user_id = self._ids.get(telegram_id)
+        if user_id is None:
+            self.misses += 1
+            return None
+        self._ids.move_to_end(telegram_id)
+        self.hits += 1
+        return UserId(user_id)
+
+    def remember(self, telegram_id: TelegramId, user_id: UserId) -> None:
+        self._ids[telegram_id] = user_id
+        self._ids.move_to_end(telegram_id)
+        while len(self._ids) > self.max_size:
+            self._ids.popitem(last=False)
+
+    def forget(self, telegram_id: TelegramId) -> None:
+        self._ids.pop(telegram_id, None)
+
+
+user_ids = UserIdCache(max_size=config.USER_ID_CACHE_SIZE)
@@ -1,20 +1,223 @@
-from typing import Dict, Tuple
+from __future__ import annotations
+
+import logging
+import sys
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
 from app.steps_bot.db.models.walk import WalkForm
+from app.steps_bot.services.edit_coalescer import walk_status_editor
+from app.steps_bot.storage.walk_store import WalkStateStore, create_walk_store
+
+logger = logging.getLogger(__name__)
+
+# Сессия без обновлений дольше этого времени считается брошенной
+WALK_IDLE_TTL_SECONDS = 6 * 60 * 60
+# Как часто start() попутно чистит реестр
+EVICT_INTERVAL_SECONDS = 10 * 60
+
+
+class WalkSession:
+    """
+    Состояние одной активной прогулки пользователя.
+    """
+    __slots__ = (
+        "telegram_id",
+        "chat_id",
+        "message_id",
+        "coords",
+        "coords_ts",
+        "steps",
+        "step_goal",
+        "was_over_speed",
+        "form",
+        "multiplier",
+        "temp_c",
+        "temp_updated_at",
+        "started_at",
+        "last_update_at",
+        "live_until",
+    )
+
+    def __init__(
+        self,
+        telegram_id: int,
+        chat_id: int,
+        coords: Tuple[float, float],
+        form: WalkForm,
+        step_goal: int,
+        now: float,
+    ) -> None:
+        self.telegram_id = telegram_id
+        self.chat_id = chat_id
+        self.message_id: Optional[int] = None
+        self.coords = coords
+        self.coords_ts = now
+        self.steps = 0
+        self.step_goal = step_goal
+        self.was_over_speed = False
+        self.form = form
+        self.multiplier = 1
+        self.temp_c: Optional[int] = None
+        self.temp_updated_at: Optional[float] = None
+        self.started_at = now
+        self.last_update_at = now
+        # Момент окончания трансляции геолокации (live_period), если известен
+        self.live_until: Optional[float] = None
+
+    def __repr__(self) -> str:
+        return f"<WalkSession tg={self.telegram_id} steps={self.steps}/{self.step_goal}>"
+
+
+class WalkRegistry:
+    """
+    Реестр активных прогулок по telegram_id с явным жизненным циклом
+    start → update → finish и вытеснением простаивающих сессий.
+    """
+
+    def __init__(self, store: WalkStateStore, idle_ttl: float = WALK_IDLE_TTL_SECONDS) -> None:
+        self.store = store
+        self.idle_ttl = idle_ttl
+        self._sessions: Dict[int, WalkSession] = {}
+        self._last_evict_at = time.time()
+        store.on_lost = self._on_lost
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __iter__(self) -> Iterator[WalkSession]:
+        return iter(list(self._sessions.values()))
+
+    async def open(self) -> None:
+        """
+        Запускает хранилище. Прогулки из общего хранилища подхватываются лениво:
+        get_or_load по первому обновлению, adopt_expired — брошенные.
+        """
+        await self.store.open()
+
+    async def close(self) -> None:
+        await self.store.close()
+
+    def get(self, telegram_id: int) -> Optional[WalkSession]:
+        return self._sessions.get(telegram_id)
+
+    def is_current(self, session: WalkSession) -> bool:
+        """
+        Проверяет, что сессия не была завершена или заменена, пока обработчик ждал сеть.
+        """
+        return self._sessions.get(session.telegram_id) is session
+
+    async def get_or_load(self, telegram_id: int) -> Optional[WalkSession]:
+        """
+        Возвращает прогулку из памяти, а при промахе забирает её из общего
+        хранилища у процесса, который вёл её до сих пор.
+        """
+        session = self._sessions.get(telegram_id)
+        if session is not None:
+            return session
+        session = await self.store.load(telegram_id)
+        if session is not None:
+            self._sessions.setdefault(telegram_id, session)
+            session = self._sessions[telegram_id]
+        return session
+
+    def start(
+        self,
+        telegram_id: int,
+        chat_id: int,
+        coords: Tuple[float, float],
+        form: WalkForm,
+        step_goal: int,
+    ) -> WalkSession:
+        """
+        Начинает новую прогулку, заменяя незавершённую предыдущую.
+        """
+        now = time.time()
+        if now - self._last_evict_at >= EVICT_INTERVAL_SECONDS:
+            self.evict_idle(now)
+        session = WalkSession(telegram_id, chat_id, coords, form, step_goal, now)
+        self._sessions[telegram_id] = session
+        self.store.mark_dirty(session)
+        return session
+
+    def touch(self, session: WalkSession) -> None:
+        """
+        Помечает сессию изменённой для следующей контрольной точки.
+        """
+        if self._sessions.get(session.telegram_id) is session:
+            self.store.mark_dirty(session)
+
+    def update(self, session: WalkSession, coords: Tuple[float, float], ts: float) -> None:
+        """
+        Фиксирует последнюю принятую точку маршрута.
+        """
+        session.coords = coords
+        session.coords_ts = ts
+        session.last_update_at = ts
+        if self._sessions.get(session.telegram_id) is session:
+            self.store.mark_dirty(session)
+
+    def finish(self, telegram_id: int) -> Optional[WalkSession]:
+        """
+        Удаляет прогулку из реестра для начисления и возвращает её последнее
+        состояние. Контрольную точку в хранилище удаляет accrue_walk.
+        """
+        self.store.release(telegram_id)
+        return self._sessions.pop(telegram_id, None)
+
+    def expired(self, now: float, idle_seconds: float) -> list[WalkSession]:
+        """
+        Прогулки, у которых закончилась трансляция геолокации или нет обновлений дольше idle_seconds.
+        """
+        idle_deadline = now - idle_seconds
+        return [
+            s for s in self._sessions.values()
+            if (s.live_until is not None and s.live_until <= now) or s.last_update_at < idle_deadline
+        ]
+
+    async def adopt_expired(self, now: float, idle_seconds: float) -> list[WalkSession]:
+        """
+        Забирает из общего хранилища брошенные прогулки, которых нет в памяти
+        (процесс-владелец остановлен или вытеснил их), и возвращает их.
+        """
+        adopted = []
+        for session in await self.store.claim_expired(now, now - idle_seconds):
+            if session.telegram_id not in self._sessions:
+                self._sessions[session.telegram_id] = session
+                adopted.append(session)
+        return adopted
+
+    def evict_idle(self, now: Optional[float] = None) -> list[WalkSession]:
+        """
+        Убирает из памяти сессии без обновлений дольше idle_ttl. Контрольная
+        точка в хранилище остаётся, начисление за прогулку — дело автозавершения.
+        """
+        now = time.time() if now is None else now
+        self._last_evict_at = now
+        deadline = now - self.idle_ttl
+        evicted = [s for s in self._sessions.values() if s.last_update_at < deadline]
+        for s in evicted:
+            del self._sessions[s.telegram_id]
+            self.store.release(s.telegram_id)
+            walk_status_editor.forget(s.chat_id)
+        return evicted
+
+    def _on_lost(self, telegram_id: int) -> None:
+        session = self._sessions.pop(telegram_id, None)
+        if session is not None:
+            walk_status_editor.forget(session.chat_id)
+
+    def memory_report(self) -> Dict[str, int]:
+        """
+        Оценка занимаемой реестром памяти в байтах.
+        """
+        session_bytes = 0
+        for s in self._sessions.values():
+            session_bytes += sys.getsizeof(s) + sys.getsizeof(s.coords)
+        return {
+            "sessions": len(self._sessions),
+            "sessions_bytes": session_bytes + sys.getsizeof(self._sessions),
+        }
+
 
-# Гео и лайв-сообщение
-user_coords: Dict[int, Tuple[float, float]] = {}
-user_steps: Dict[int, int] = {}
-user_msg_id: Dict[int, dict] = {}
-user_was_over_speed: Dict[int, bool] = {}
-user_walk_finished: Dict[int, bool] = {}
-
-# Дополнительно для коэффициентов/формы/времени
-user_walk_multiplier: Dict[int, int] = {}
-user_walk_form: Dict[int, WalkForm] = {}
-user_walk_started_at: Dict[int, float] = {}
-user_temp_c: dict[int, int | None] = {}
-user_temp_updated_at: dict[int, float] = {}
-
-# Дневной лимит шагов
-user_daily_steps_used: Dict[int, int] = {}
-user_daily_steps_date: Dict[int, str] = {}
\ No newline at end of file
+walk_registry = WalkRegistry(store=create_walk_store())
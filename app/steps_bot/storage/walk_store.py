@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.steps_bot.db.models.active_walk import ActiveWalk
+from app.steps_bot.db.repo import get_session
+from app.steps_bot.db.session import engine
+from app.steps_bot.services.invalidation_bus import invalidation_bus
+from app.steps_bot.settings import config
+
+if TYPE_CHECKING:
+    from app.steps_bot.storage.user_memory import WalkSession
+
+logger = logging.getLogger(__name__)
+
+# Сколько помнить, что у пользователя нет прогулки в хранилище
+MISS_TTL_SECONDS = 60.0
+# Событие шины «процесс забрал прогулку», ключ "<telegram_id>:<owner>"
+CLAIM_EVENT = "active_walk_claimed"
+
+
+class WalkStateStore:
+    """
+    Интерфейс хранилища состояния прогулок. Горячий путь вызывает только
+    синхронные mark_* методы; запись во внешнее хранилище — дело бэкенда.
+    """
+
+    # Идентификатор процесса-владельца прогулок; None — владельцев нет (один процесс)
+    owner: Optional[str] = None
+    # Вызывается с telegram_id, когда прогулку перехватил другой процесс
+    on_lost: Optional[Callable[[int], None]] = None
+
+    async def open(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def load(self, telegram_id: int) -> Optional[WalkSession]:
+        return None
+
+    async def claim_expired(self, now: float, idle_deadline: float) -> List[WalkSession]:
+        """
+        Забирает прогулки, брошенные по общей контрольной точке: трансляция
+        геолокации закончилась или обновлений не было с idle_deadline.
+        """
+        return []
+
+    def mark_dirty(self, session: WalkSession) -> None:
+        pass
+
+    def release(self, telegram_id: int) -> None:
+        """
+        Прогулка ушла из памяти процесса (завершается с начислением или
+        вытеснена): хранилище больше не пишет её контрольную точку. Удаляет
+        точку только accrue_walk вместе с начислением.
+        """
+
+    async def settle(self, session: WalkSession) -> bool:
+        """
+        Вызывается перед начислением за отпущенную прогулку. True — контрольная
+        точка есть в общем хранилище и записана последним состоянием session:
+        начислять можно только вместе с её удалением
+        (accrue_walk(require_checkpoint=True, owner=self.owner)).
+        """
+        return False
+
+
+class MemoryWalkStore(WalkStateStore):
+    """
+    Состояние живёт только в памяти процесса и теряется при рестарте.
+    """
+
+
+class PostgresWalkStore(WalkStateStore):
+    """
+    Хранит контрольные точки прогулок в таблице active_walks.
+
+    Изменения копятся в локальном буфере и сбрасываются фоновой задачей раз
+    в checkpoint_interval секунд, поэтому обработка геолокации не ждёт БД.
+
+    У каждой прогулки один владелец (active_walks.owner) — процесс, который
+    ведёт её в памяти. Процесс, получивший обновление прогулки, которой у него
+    нет, забирает её себе (load) и сообщает об этом по шине; прежний владелец
+    забывает свою копию. Контрольную точку пишет и удаляет с начислением только
+    владелец, поэтому устаревшая копия не затирает чужие шаги. Несохранённые
+    изменения прежнего владельца (не больше checkpoint_interval) при передаче
+    теряются.
+
+    При рестарте прогулки не загружаются заранее: активные подхватываются
+    по первому обновлению геолокации, брошенные забирает автозавершение
+    (claim_expired).
+    """
+
+    def __init__(self, checkpoint_interval: float) -> None:
+        self.checkpoint_interval = checkpoint_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[-64:]
+        self._dirty: Dict[int, WalkSession] = {}
+        # Снимок _dirty, который сейчас пишет checkpoint
+        self._flushing: Dict[int, WalkSession] = {}
+        self._misses: Dict[int, float] = {}
+        # Прогулки, чья контрольная точка в active_walks принадлежит этому процессу
+        self._owned: Set[int] = set()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def open(self) -> None:
+        if self._task is None:
+            invalidation_bus.subscribe(CLAIM_EVENT, self._on_claimed, replay=False)
+            self._task = asyncio.create_task(self._checkpoint_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.checkpoint()
+
+    def mark_dirty(self, session: WalkSession) -> None:
+        self._misses.pop(session.telegram_id, None)
+        self._dirty[session.telegram_id] = session
+
+    def release(self, telegram_id: int) -> None:
+        self._dirty.pop(telegram_id, None)
+        self._flushing.pop(telegram_id, None)
+
+    async def settle(self, session: WalkSession) -> bool:
+        # Дожидаемся идущей контрольной точки: её INSERT должен стать видимым
+        # до DELETE в accrue_walk. Запись идёт мимо сессии апдейта, иначе
+        # блокировка строки дожила бы до конца обработчика и остановила DELETE
+        async with self._flush_lock:
+            telegram_id = session.telegram_id
+            if telegram_id not in self._owned:
+                return False
+            self._owned.discard(telegram_id)
+            async with engine.begin() as conn:
+                await conn.execute(_UPDATE_OWNED_WALK, {**_update_params(_to_row(session)), "b_owner": self.owner})
+            return True
+
+    async def load(self, telegram_id: int) -> Optional[WalkSession]:
+        """
+        Забирает прогулку, которую ведёт другой процесс (или процесс до рестарта).
+        Промахи кэшируются, чтобы трансляция геолокации после завершения
+        прогулки не ходила в БД.
+        """
+        now = time.monotonic()
+        missed_at = self._misses.get(telegram_id)
+        if missed_at is not None and now - missed_at < MISS_TTL_SECONDS:
+            return None
+        async with engine.begin() as conn:
+            row = (await conn.execute(
+                _CLAIM_WALKS.where(active_walks.c.telegram_id == telegram_id),
+                {"owner": self.owner},
+            )).first()
+        if row is None:
+            if len(self._misses) > 10_000:
+                self._misses.clear()
+            self._misses[telegram_id] = now
+            return None
+        self._owned.add(telegram_id)
+        await invalidation_bus.publish(CLAIM_EVENT, f"{telegram_id}:{self.owner}")
+        return _to_session(row)
+
+    async def claim_expired(self, now: float, idle_deadline: float) -> List[WalkSession]:
+        # Уведомление не нужно: прежний владелец тоже считает прогулку брошенной,
+        # а его попытка начислить не пройдёт проверку владельца в accrue_walk
+        async with engine.begin() as conn:
+            rows = (await conn.execute(
+                _CLAIM_WALKS.where(
+                    (active_walks.c.last_update_at < idle_deadline) | (active_walks.c.live_until <= now)
+                ),
+                {"owner": self.owner},
+            )).all()
+        self._owned.update(row.telegram_id for row in rows)
+        return [_to_session(row) for row in rows]
+
+    async def checkpoint(self) -> None:
+        """
+        Сбрасывает накопленные изменения одним батчем.
+
+        Новые прогулки вставляются (и забираются этим процессом), уже записанные
+        обновляются, только пока принадлежат ему. Прогулки, которые забрал
+        другой процесс или уже удалило начисление, этот процесс забывает.
+        """
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            self._flushing, self._dirty = self._dirty, {}
+            new_rows = [
+                {**_to_row(s), "owner": self.owner}
+                for tid, s in self._flushing.items() if tid not in self._owned
+            ]
+            known = sorted(tid for tid in self._flushing if tid in self._owned)
+            held: Set[int] = set()
+            try:
+                async with get_session() as s:
+                    if new_rows:
+                        stmt = insert(ActiveWalk).values(new_rows)
+                        set_ = {col: stmt.excluded[col] for col in new_rows[0] if col != "telegram_id"}
+                        set_["updated_at"] = func.now()
+                        stmt = stmt.on_conflict_do_update(
+                            index_elements=[ActiveWalk.telegram_id],
+                            set_=set_,
+                        )
+                        await s.execute(stmt)
+                    if known:
+                        held = set(await s.scalars(
+                            select(ActiveWalk.telegram_id)
+                            .where(ActiveWalk.telegram_id.in_(known), ActiveWalk.owner == self.owner)
+                            .order_by(ActiveWalk.telegram_id)
+                            .with_for_update()
+                        ))
+                        rows = [
+                            _update_params(_to_row(self._flushing[tid]))
+                            for tid in known if tid in held and tid in self._flushing
+                        ]
+                        if rows:
+                            await s.execute(_UPDATE_WALK, rows)
+            except Exception:
+                # Возвращаем несохранённое в буфер, более свежие изменения не затираем
+                for tid, session in self._flushing.items():
+                    self._dirty.setdefault(tid, session)
+                self._flushing = {}
+                raise
+            self._flushing = {}
+            self._owned.update(row["telegram_id"] for row in new_rows)
+            for tid in known:
+                if tid not in held and tid in self._owned:
+                    self._lose(tid)
+
+    def _on_claimed(self, key: Optional[str]) -> None:
+        if key is None:
+            return
+        telegram_id, _, owner = key.partition(":")
+        if owner != self.owner and int(telegram_id) in self._owned:
+            self._lose(int(telegram_id))
+
+    def _lose(self, telegram_id: int) -> None:
+        """
+        Прогулку забрал другой процесс: забываем локальную копию.
+        """
+        self._owned.discard(telegram_id)
+        self._dirty.pop(telegram_id, None)
+        self._flushing.pop(telegram_id, None)
+        logger.info("walk of %s was taken over by another process", telegram_id)
+        if self.on_lost is not None:
+            self.on_lost(telegram_id)
+
+    async def _checkpoint_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await self.checkpoint()
+            except Exception as e:
+                logger.error("walk checkpoint failed: %s", e)
+
+
+def _to_row(session: WalkSession) -> dict:
+    return {
+        "telegram_id": session.telegram_id,
+        "chat_id": session.chat_id,
+        "message_id": session.message_id,
+        "lat": session.coords[0],
+        "lon": session.coords[1],
+        "coords_ts": session.coords_ts,
+        "steps": session.steps,
+        "step_goal": session.step_goal,
+        "was_over_speed": session.was_over_speed,
+        "walk_form": session.form,
+        "multiplier": session.multiplier,
+        "temp_c": session.temp_c,
+        "temp_updated_at": session.temp_updated_at,
+        "started_at": session.started_at,
+        "last_update_at": session.last_update_at,
+        "live_until": session.live_until,
+    }
+
+
+_WALK_COLUMNS = (
+    "chat_id", "message_id", "lat", "lon", "coords_ts", "steps", "step_goal", "was_over_speed",
+    "walk_form", "multiplier", "temp_c", "temp_updated_at", "started_at", "last_update_at", "live_until",
+)
+
+active_walks = ActiveWalk.__table__
+
+# UPDATE без вставки: executemany по списку параметров _update_params
+_UPDATE_WALK = (
+    update(active_walks)
+    .where(active_walks.c.telegram_id == bindparam("b_telegram_id"))
+    .values({col: bindparam(f"b_{col}") for col in _WALK_COLUMNS + ("updated_at",)})
+)
+_UPDATE_OWNED_WALK = _UPDATE_WALK.where(active_walks.c.owner == bindparam("b_owner"))
+
+# Забирает прогулки себе и возвращает их контрольные точки; условие добавляет вызывающий
+_CLAIM_WALKS = (
+    update(active_walks)
+    .values(owner=bindparam("owner"), updated_at=func.now())
+    .returning(*active_walks.c)
+)
+
+
+def _update_params(row: dict) -> dict:
+    params = {f"b_{col}": value for col, value in row.items()}
+    params["b_updated_at"] = dt.datetime.now(dt.timezone.utc)
+    return params
+
+
+def _to_session(row) -> WalkSession:
+    from app.steps_bot.storage.user_memory import WalkSession
+
+    session = WalkSession(
+        row.telegram_id,
+        row.chat_id,
+        (row.lat, row.lon),
+        row.walk_form,
+        row.step_goal,
+        row.started_at,
+    )
+    session.message_id = row.message_id
+    session.coords_ts = row.coords_ts
+    session.steps = row.steps
+    session.was_over_speed = row.was_over_speed
+    session.multiplier = row.multiplier
+    session.temp_c = row.temp_c
+    session.temp_updated_at = row.temp_updated_at
+    session.last_update_at = row.last_update_at
+    session.live_until = row.live_until
+    return session
+
+
+def create_walk_store() -> WalkStateStore:
+    """
+    Создаёт хранилище по настройке WALK_STATE_BACKEND (memory | postgres).
+
+    memory годится только для одного процесса бота: несколько реплик не видят
+    прогулок друг друга. Для нескольких реплик нужен postgres.
+    """
+    backend = (config.WALK_STATE_BACKEND or "memory").lower()
+    if backend == "postgres":
+        return PostgresWalkStore(checkpoint_interval=config.WALK_CHECKPOINT_SECONDS)
+    if backend != "memory":
+        logger.warning("Unknown WALK_STATE_BACKEND=%s, falling back to memory", backend)
+    return MemoryWalkStore()
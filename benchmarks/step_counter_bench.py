@@ -0,0 +1,89 @@
+"""
+Микро-бенчмарк обработки одного live-обновления геолокации.
+
+Сравнивает прежний путь (до трёх вызовов geopy.geodesic на обновление) с
+evaluate_sample. Запуск из корня репозитория:
+
+    python -m benchmarks.step_counter_bench
+"""
+from __future__ import annotations
+
+import random
+import timeit
+
+from geopy.distance import geodesic
+
+from app.steps_bot.services.step_counter import (
+    MAX_DISTANCE,
+    MAX_SPEED,
+    MIN_DISTANCE,
+    STEP_LENGTH,
+    evaluate_sample,
+)
+
+SAMPLES = 2000
+REPEAT = 5
+
+
+def _legacy_update(prev, prev_ts, curr, curr_ts):
+    """Повторяет старую последовательность вызовов из handle_live_location_update."""
+    distance_m = geodesic(prev, curr).meters
+    delta_t = curr_ts - prev_ts
+    speed_kmh = (distance_m / delta_t) * 3.6 if delta_t > 0 else 0.0
+
+    too_fast = delta_t <= 0 or (geodesic(prev, curr).meters / delta_t) * 3.6 > MAX_SPEED
+    steps = 0
+    if not too_fast:
+        distance = geodesic(prev, curr).meters
+        if MIN_DISTANCE <= distance <= MAX_DISTANCE:
+            steps = int(distance / STEP_LENGTH)
+    return distance_m, speed_kmh, too_fast, steps
+
+
+def _make_track(n: int) -> list[tuple[tuple[float, float], float, tuple[float, float], float]]:
+    """Генерирует пары точек со смещением 5–50 м и интервалом 10–30 с."""
+    rnd = random.Random(42)
+    track = []
+    lat, lon, ts = 55.7558, 37.6173, 0.0
+    for _ in range(n):
+        d_lat = rnd.uniform(-45, 45) / 111_000
+        d_lon = rnd.uniform(-45, 45) / 63_000
+        dt = rnd.uniform(10, 30)
+        track.append(((lat, lon), ts, (lat + d_lat, lon + d_lon), ts + dt))
+        lat, lon, ts = lat + d_lat, lon + d_lon, ts + dt
+    return track
+
+
+def main() -> None:
+    track = _make_track(SAMPLES)
+
+    max_err = 0.0
+    mismatched_steps = 0
+    for prev, prev_ts, curr, curr_ts in track:
+        legacy = _legacy_update(prev, prev_ts, curr, curr_ts)
+        sample = evaluate_sample(prev, prev_ts, curr, curr_ts)
+        max_err = max(max_err, abs(legacy[0] - sample.distance_m))
+        if legacy[3] != sample.steps:
+            mismatched_steps += 1
+
+    def run_legacy():
+        for args in track:
+            _legacy_update(*args)
+
+    def run_new():
+        for args in track:
+            evaluate_sample(*args)
+
+    legacy_best = min(timeit.repeat(run_legacy, number=1, repeat=REPEAT)) / SAMPLES
+    new_best = min(timeit.repeat(run_new, number=1, repeat=REPEAT)) / SAMPLES
+
+    print(f"samples per run:        {SAMPLES}")
+    print(f"legacy (3× geodesic):   {legacy_best * 1e6:8.2f} µs/update")
+    print(f"evaluate_sample:        {new_best * 1e6:8.2f} µs/update")
+    print(f"speed-up:               {legacy_best / new_best:8.1f}×")
+    print(f"max distance error:     {max_err * 1000:8.4f} mm")
+    print(f"step count mismatches:  {mismatched_steps}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Бенчмарк завершения прогулки: число SQL-операторов и задержка на одну прогулку.
+
+Прогоняет accrue_walk на наборе пользователей (в семье и без, с пригласившим
+и без) и проверяет итог: балансы, step_count и число проводок. Корректность
+отдельных случаев покрывает tests/test_walk_accrual.py.
+
+Нужна доступная БД из настроек бота; используйте отдельную базу — бенчмарк
+создаёт и затем удаляет своих пользователей и семьи. Запуск из корня репозитория:
+
+    python -m benchmarks.walk_accrual_bench
+"""
+from __future__ import annotations
+
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List, Tuple
+
+from sqlalchemy import delete, event, func, select
+
+from app.steps_bot.db.models import Family, LedgerEntry, Referral, User
+from app.steps_bot.db.repo import get_session
+from app.steps_bot.db.session import engine
+from app.steps_bot.services.referral_service import get_referral_reward_percent
+from app.steps_bot.services.walk_accrual import accrue_walk
+
+USERS_PER_VARIANT = 40
+WALKS_PER_USER = 5
+STEPS = 1200
+MULTIPLIER = 2
+# Диапазон telegram_id, которого нет у настоящих пользователей
+TG_BASE = -9_000_000_000
+
+
+class _Counter:
+    def __init__(self) -> None:
+        self.statements = 0
+        self.transactions = 0
+
+    def install(self) -> None:
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine.sync_engine, "begin", self._on_begin)
+
+    def _on_execute(self, *args) -> None:
+        self.statements += 1
+
+    def _on_begin(self, conn) -> None:
+        # В режиме AUTOCOMMIT BEGIN/COMMIT на сервер не отправляются
+        if conn.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+            self.transactions += 1
+
+    def reset(self) -> None:
+        self.statements = 0
+        self.transactions = 0
+
+
+async def _finish(telegram_id: int) -> None:
+    await accrue_walk(
+        telegram_id,
+        steps=STEPS,
+        points=STEPS * MULTIPLIER,
+        multiplier=MULTIPLIER,
+    )
+
+
+async def _create_users(offset: int) -> List[int]:
+    """
+    Пользователи варианта: четверть без семьи и без пригласившего, четверть
+    в семье, четверть приглашена пользователем без семьи, четверть приглашена
+    из своей же семьи. Возвращает telegram_id.
+    """
+    async with get_session() as s:
+        family = Family(name=f"bench-{offset}")
+        s.add(family)
+        await s.flush()
+        inviter = User(telegram_id=TG_BASE + offset, username=f"bench_inviter_{offset}")
+        family_inviter = User(
+            telegram_id=TG_BASE + offset + 1, username=f"bench_family_inviter_{offset}", family_id=family.id
+        )
+        s.add_all([inviter, family_inviter])
+        await s.flush()
+
+        tids = []
+        for i in range(USERS_PER_VARIANT):
+            kind = i % 4
+            user = User(
+                telegram_id=TG_BASE + offset + 10 + i,
+                username=f"bench_{offset}_{i}",
+                family_id=family.id if kind in (1, 3) else None,
+            )
+            s.add(user)
+            await s.flush()
+            if kind == 2:
+                s.add(Referral(user_id=user.id, inviter_id=inviter.id))
+            elif kind == 3:
+                s.add(Referral(user_id=user.id, inviter_id=family_inviter.id))
+            tids.append(user.telegram_id)
+    return tids
+
+
+async def _snapshot(offset: int) -> List[Tuple]:
+    """Балансы, шаги и число проводок пользователей варианта по порядку создания."""
+    async with get_session() as s:
+        users = (await s.scalars(
+            select(User)
+            .where(User.telegram_id.between(TG_BASE + offset, TG_BASE + offset + 10 + USERS_PER_VARIANT))
+            .order_by(User.telegram_id)
+        )).all()
+        rows = []
+        for u in users:
+            entries = await s.scalar(select(func.count()).where(LedgerEntry.user_id == u.id))
+            rows.append((u.balance, u.step_count, entries))
+        family = await s.scalar(select(Family.balance).where(Family.name == f"bench-{offset}"))
+    return rows + [(family,)]
+
+
+async def _cleanup() -> None:
+    async with get_session() as s:
+        await s.execute(delete(User).where(User.telegram_id.between(TG_BASE, TG_BASE + 10_000)))
+        await s.execute(delete(Family).where(Family.name.like("bench-%")))
+
+
+async def _run(label: str, tids: List[int], finish: Callable[[int], Awaitable[None]], counter: _Counter) -> None:
+    latencies = []
+    counter.reset()
+    for _ in range(WALKS_PER_USER):
+        for tid in tids:
+            started = time.perf_counter()
+            await finish(tid)
+            latencies.append(time.perf_counter() - started)
+    walks = len(latencies)
+    latencies.sort()
+    # Запросы к серверу: операторы плюс BEGIN и COMMIT каждой явной транзакции
+    round_trips = counter.statements + 2 * counter.transactions
+    print(
+        f"{label:<8} statements/walk {counter.statements / walks:5.2f}  "
+        f"round trips/walk {round_trips / walks:5.2f}  "
+        f"median {statistics.median(latencies) * 1000:7.2f} ms  "
+        f"p95 {latencies[int(walks * 0.95) - 1] * 1000:7.2f} ms"
+    )
+
+
+def _expected(walks: List[int], percent: int) -> List[Tuple]:
+    """
+    Ожидаемый _snapshot: walks[i] — сколько прогулок завершил i-й пользователь.
+    """
+    points = STEPS * MULTIPLIER
+    reward = points * percent // 100
+    inviter_balance = inviter_entries = family_balance = 0
+    rows = []
+    for i, n in enumerate(walks):
+        kind = i % 4
+        in_family = kind in (1, 3)
+        rows.append((0 if in_family else n * points, n * STEPS, n))
+        if in_family:
+            family_balance += n * points
+        if kind == 2 and reward > 0:
+            inviter_balance += n * reward
+            inviter_entries += n
+        elif kind == 3:
+            family_balance += n * reward
+    return [(inviter_balance, 0, inviter_entries), (0, 0, 0)] + rows + [(family_balance,)]
+
+
+async def main() -> None:
+    await _cleanup()
+    counter = _Counter()
+    counter.install()
+    try:
+        tids = await _create_users(0)
+
+        # Прогрев: кэш настроек, кэш users.id, подготовленные операторы
+        await _finish(tids[0])
+
+        print(f"walks: {USERS_PER_VARIANT * WALKS_PER_USER}")
+        await _run("cte", tids, _finish, counter)
+
+        walks = [WALKS_PER_USER] * len(tids)
+        walks[0] += 1
+        ok = await _snapshot(0) == _expected(walks, await get_referral_reward_percent())
+        print(f"balances, step counts and ledger entries as expected: {ok}")
+    finally:
+        await _cleanup()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
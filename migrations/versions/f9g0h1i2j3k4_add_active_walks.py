@@ -0,0 +1,49 @@
+"""add active walks table
+
+Revision ID: f9g0h1i2j3k4
+Revises: e8f9g0h1i2j3
+Create Date: 2025-10-24 10:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as pg
+
+
+revision = "f9g0h1i2j3k4"
+down_revision = "e8f9g0h1i2j3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    walkform = pg.ENUM("stroller", "dog", "stroller_dog", name="walkform", create_type=False)
+
+    op.create_table(
+        "active_walks",
+        sa.Column("telegram_id", sa.BigInteger(), primary_key=True),
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("message_id", sa.BigInteger(), nullable=True),
+        sa.Column("lat", sa.Float(), nullable=False),
+        sa.Column("lon", sa.Float(), nullable=False),
+        sa.Column("coords_ts", sa.Float(), nullable=False),
+        sa.Column("steps", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("step_goal", sa.Integer(), nullable=False),
+        sa.Column("was_over_speed", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("walk_form", walkform, nullable=False),
+        sa.Column("multiplier", sa.SmallInteger(), nullable=False, server_default="1"),
+        sa.Column("temp_c", sa.SmallInteger(), nullable=True),
+        sa.Column("temp_updated_at", sa.Float(), nullable=True),
+        sa.Column("started_at", sa.Float(), nullable=False),
+        sa.Column("last_update_at", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+    op.create_index("ix_active_walks_last_update_at", "active_walks", ["last_update_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_active_walks_last_update_at", table_name="active_walks")
+    op.drop_table("active_walks")
@@ -0,0 +1,26 @@
+"""add live_until to active walks
+
+Revision ID: g0h1i2j3k4l5
+Revises: f9g0h1i2j3k4
+Create Date: 2025-10-25 10:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "g0h1i2j3k4l5"
+down_revision = "f9g0h1i2j3k4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("active_walks", sa.Column("live_until", sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("active_walks", "live_until")
@@ -0,0 +1,28 @@
+"""add media_hash to broadcasts
+
+Revision ID: i2j3k4l5m6n7
+Revises: h1i2j3k4l5m6
+Create Date: 2025-10-27 10:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "i2j3k4l5m6n7"
+down_revision = "h1i2j3k4l5m6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("broadcasts", sa.Column("media_hash", sa.String(length=64), nullable=True))
+    op.create_index("ix_broadcasts_media_hash", "broadcasts", ["media_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_broadcasts_media_hash", table_name="broadcasts")
+    op.drop_column("broadcasts", "media_hash")
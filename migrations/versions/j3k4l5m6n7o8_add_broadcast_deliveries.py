@@ -0,0 +1,48 @@
+"""add broadcast deliveries
+
+Revision ID: j3k4l5m6n7o8
+Revises: i2j3k4l5m6n7
+Create Date: 2025-10-28 10:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql as pg
+
+
+revision = "j3k4l5m6n7o8"
+down_revision = "i2j3k4l5m6n7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Статусы доставки совпадают со статусами рассылки: pending / sent / failed
+    bstatus = pg.ENUM("pending", "sent", "failed", name="broadcaststatus", create_type=False)
+
+    op.create_table(
+        "broadcast_deliveries",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("broadcast_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.BigInteger(), nullable=False),
+        sa.Column("status", bstatus, nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.SmallInteger(), nullable=False, server_default="0"),
+        sa.Column("error", sa.String(length=255), nullable=True),
+        sa.Column("sent_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(["broadcast_id"], ["broadcasts.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.UniqueConstraint("broadcast_id", "user_id", name="uq_delivery_broadcast_user"),
+    )
+    op.create_index(
+        "ix_delivery_broadcast_status",
+        "broadcast_deliveries",
+        ["broadcast_id", "status", "user_id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_delivery_broadcast_status", table_name="broadcast_deliveries")
+    op.drop_table("broadcast_deliveries")
@@ -0,0 +1,34 @@
+"""add in_progress status and lease columns to broadcasts
+
+Revision ID: k4l5m6n7o8p9
+Revises: j3k4l5m6n7o8
+Create Date: 2025-10-29 10:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "k4l5m6n7o8p9"
+down_revision = "j3k4l5m6n7o8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # ALTER TYPE ... ADD VALUE cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE broadcaststatus ADD VALUE IF NOT EXISTS 'in_progress' AFTER 'pending'")
+
+    op.add_column("broadcasts", sa.Column("claimed_by", sa.String(length=64), nullable=True))
+    op.add_column("broadcasts", sa.Column("lease_until", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.execute("UPDATE broadcasts SET status = 'pending' WHERE status = 'in_progress'")
+    op.drop_column("broadcasts", "lease_until")
+    op.drop_column("broadcasts", "claimed_by")
+    # The 'in_progress' enum value stays: Postgres cannot drop enum values
@@ -0,0 +1,28 @@
+"""add audience segment to broadcasts
+
+Revision ID: l5m6n7o8p9q0
+Revises: k4l5m6n7o8p9
+Create Date: 2025-10-30 10:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "l5m6n7o8p9q0"
+down_revision = "k4l5m6n7o8p9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # NULL segment means "all active users", so existing broadcasts keep their audience
+    op.add_column("broadcasts", sa.Column("segment", postgresql.JSONB(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("broadcasts", "segment")
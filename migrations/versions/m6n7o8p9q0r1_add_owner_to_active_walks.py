@@ -0,0 +1,28 @@
+"""add owner to active walks
+
+Revision ID: m6n7o8p9q0r1
+Revises: l5m6n7o8p9q0
+Create Date: 2025-11-01 10:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "m6n7o8p9q0r1"
+down_revision = "l5m6n7o8p9q0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Bot process that holds the walk in memory; NULL for checkpoints written before owners existed,
+    # such walks are claimed by the first process that loads them
+    op.add_column("active_walks", sa.Column("owner", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("active_walks", "owner")
@@ -0,0 +1,8 @@
+import os
+
+# Обязательные настройки бота, чтобы модули приложения импортировались без .env
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("WEBHOOK_URL", "http://localhost")
+os.environ.setdefault("API_KEY", "test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_PORT", "5432")
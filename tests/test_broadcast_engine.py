@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from app.steps_bot.services.broadcast_engine import ChatLimiter
+
+
+def test_chat_limiter_spaces_messages_to_one_chat():
+    limiter = ChatLimiter(0.05)
+
+    async def scenario():
+        started = time.monotonic()
+        for _ in range(3):
+            await limiter.wait(1)
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.1
+
+
+def test_chat_limiter_forgets_expired_chats():
+    limiter = ChatLimiter(0.05)
+
+    async def scenario():
+        for chat_id in range(1000):
+            await limiter.wait(chat_id)
+        await asyncio.sleep(0.06)
+        await limiter.wait(-1)
+        return len(limiter)
+
+    assert asyncio.run(scenario()) == 1
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+
+from app.steps_bot.services import broadcast_service
+from app.steps_bot.settings import config
+
+DELIVERIES = 23
+
+
+class FakeJournal:
+    """
+    Журнал доставок в памяти: доставка i — пользователю i с telegram_id 1000 + i.
+    Первая запись результатов падает.
+    """
+
+    def __init__(self) -> None:
+        self.status = {did: "pending" for did in range(1, DELIVERIES + 1)}
+        self.sends = Counter()
+        self.record_calls = 0
+
+    async def claim(self, broadcast_id, after, chunk_size):
+        pending = [did for did, status in self.status.items() if status == "pending" and did > after]
+        return [(did, did, 1000 + did) for did in pending[:chunk_size]]
+
+    async def send(self, chat_id, b, media):
+        self.sends[chat_id] += 1
+        await asyncio.sleep(0.001)
+
+    async def record(self, sent_ids, failed):
+        self.record_calls += 1
+        if self.record_calls == 1:
+            raise RuntimeError("connection reset")
+        for did in sent_ids:
+            self.status[did] = "sent"
+        for did in failed:
+            self.status[did] = "failed"
+
+    async def counts(self, broadcast_id):
+        return dict(Counter(self.status.values()))
+
+
+def test_failed_record_is_retried_not_resent(monkeypatch):
+    journal = FakeJournal()
+
+    async def nothing(*args, **kwargs):
+        return None
+
+    async def no_media(b):
+        return None, None
+
+    monkeypatch.setattr(config, "BROADCAST_CHUNK_SIZE", 5)
+    monkeypatch.setattr(config, "BROADCAST_WORKERS", 3)
+    monkeypatch.setattr(config, "BROADCAST_RATE_PER_SECOND", 1000.0)
+    monkeypatch.setattr(broadcast_service, "_enqueue_deliveries", nothing)
+    monkeypatch.setattr(broadcast_service, "_fail_exhausted", nothing)
+    monkeypatch.setattr(broadcast_service, "prepare_broadcast_media", no_media)
+    monkeypatch.setattr(broadcast_service, "_claim_deliveries", journal.claim)
+    monkeypatch.setattr(broadcast_service, "_send", journal.send)
+    monkeypatch.setattr(broadcast_service, "_record_deliveries", journal.record)
+    monkeypatch.setattr(broadcast_service, "delivery_counts", journal.counts)
+
+    b = SimpleNamespace(id=1, telegram_file_id=None)
+    counts = asyncio.run(broadcast_service.send_broadcast_now(b))
+
+    assert journal.record_calls > 1
+    assert counts["sent"] == DELIVERIES
+    assert set(journal.sends.values()) == {1}
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.steps_bot.db.models.walk import WalkForm
+from app.steps_bot.services.coefficients_service import CoefficientsSnapshot
+
+
+def test_invalidation_during_reload_reloads_again(monkeypatch):
+    table = {WalkForm.DOG: 2}
+    snapshot = CoefficientsSnapshot(reload_interval=3600)
+    reads = []
+
+    async def reload():
+        # Таблица прочитана до того, как админка успела записать изменение
+        forms = dict(table)
+        reads.append(forms)
+        await asyncio.sleep(0.02)
+        snapshot._forms = forms
+
+    monkeypatch.setattr(snapshot, "reload", reload)
+
+    async def scenario():
+        snapshot.invalidate()
+        await asyncio.sleep(0.01)
+        table[WalkForm.DOG] = 3
+        snapshot.invalidate()
+        await snapshot._pending
+
+    asyncio.run(scenario())
+    assert len(reads) == 2
+    assert snapshot.walk_form_coef(WalkForm.DOG) == 3
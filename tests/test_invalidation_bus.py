@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from app.steps_bot.services.invalidation_bus import InvalidationBus
+
+
+def test_reconnect_replays_only_cache_subscribers():
+    bus = InvalidationBus()
+    caches, commands = [], []
+    bus.subscribe("contents", caches.append)
+    bus.subscribe("media_warmup", commands.append, replay=False)
+
+    bus.dispatch("media_warmup", None)
+    bus.dispatch_all()
+
+    assert caches == [None]
+    assert commands == [None]
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.steps_bot.services import settings_service
+from app.steps_bot.services.settings_service import SettingsService
+
+
+def test_invalidation_during_reload_reloads_again(monkeypatch):
+    table = {"step_goal": "5000"}
+    reads = []
+
+    async def load():
+        # Таблица прочитана до того, как админка успела записать изменение
+        values = dict(table)
+        reads.append(values)
+        await asyncio.sleep(0.02)
+        settings_service._snapshot.values = values
+        settings_service._snapshot.stale = False
+
+    monkeypatch.setattr(SettingsService, "load", staticmethod(load))
+    monkeypatch.setattr(settings_service, "_snapshot", settings_service._Snapshot())
+
+    async def scenario():
+        SettingsService.invalidate("step_goal")
+        await asyncio.sleep(0.01)
+        table["step_goal"] = "7000"
+        SettingsService.invalidate("step_goal")
+        await settings_service._snapshot.reload_task
+
+    asyncio.run(scenario())
+    assert len(reads) == 2
+    assert SettingsService.get("step_goal") == "7000"
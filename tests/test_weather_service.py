@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.steps_bot.services import weather_service as weather
+from app.steps_bot.services.weather_service import WeatherService
+
+MOSCOW = (55.7512, 37.6184)
+
+
+class FakeOpenMeteo:
+    """
+    Open-Meteo на httpx.MockTransport: считает запросы и отвечает температурой
+    по каждой переданной координате (для одной точки — объектом, как настоящий API).
+    """
+
+    def __init__(self, temperature: float = 12.4, delay: float = 0.0) -> None:
+        self.temperature = temperature
+        self.delay = delay
+        self.status_code = 200
+        self.requests: list[httpx.Request] = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.status_code != 200:
+            return httpx.Response(self.status_code)
+        points = len(request.url.params["latitude"].split(","))
+        items = [{"current_weather": {"temperature": self.temperature}} for _ in range(points)]
+        return httpx.Response(200, content=json.dumps(items[0] if points == 1 else items))
+
+    def points_per_request(self) -> list[int]:
+        return [len(r.url.params["latitude"].split(",")) for r in self.requests]
+
+
+def _service(api: FakeOpenMeteo, ttl: float = 600) -> WeatherService:
+    return WeatherService(cell_deg=0.1, ttl=ttl, max_size=1000, transport=httpx.MockTransport(api))
+
+
+def _run(service: WeatherService, scenario):
+    async def main():
+        await service.open()
+        try:
+            return await scenario()
+        finally:
+            await service.close()
+
+    return asyncio.run(main())
+
+
+def test_cache_hit_in_same_cell():
+    api = FakeOpenMeteo()
+    service = _service(api)
+
+    async def scenario():
+        first = await service.get_temp_c(*MOSCOW)
+        # Другая точка той же ячейки сетки
+        second = await service.get_temp_c(MOSCOW[0] + 0.01, MOSCOW[1] - 0.01)
+        return first, second
+
+    assert _run(service, scenario) == (12, 12)
+    assert len(api.requests) == 1
+    assert (service.hits, service.misses) == (1, 1)
+
+
+def test_concurrent_misses_share_one_request():
+    api = FakeOpenMeteo(delay=0.05)
+    service = _service(api)
+
+    async def scenario():
+        return await asyncio.gather(*(service.get_temp_c(*MOSCOW) for _ in range(10)))
+
+    assert _run(service, scenario) == [12] * 10
+    assert len(api.requests) == 1
+    assert service.coalesced == 9
+    assert service.stats()["inflight"] == 0
+
+
+def test_breaker_opens_and_serves_stale(monkeypatch):
+    monkeypatch.setattr(weather, "BREAKER_COOLDOWN_SECONDS", 0.05)
+    api = FakeOpenMeteo()
+    service = _service(api, ttl=0)
+
+    async def scenario():
+        assert await service.get_temp_c(*MOSCOW) == 12
+        api.status_code = 500
+        for _ in range(weather.BREAKER_FAILURE_THRESHOLD):
+            # Запись устарела (ttl=0), API отвечает ошибкой — отдаём последнее значение
+            assert await service.get_temp_c(*MOSCOW) == 12
+        assert service.breaker_open
+        requests = len(api.requests)
+
+        # Пока предохранитель разомкнут, в сеть не ходим
+        assert await service.get_temp_c(*MOSCOW) == 12
+        assert await service.refresh_cells([service.cell_of(*MOSCOW)]) == {service.cell_of(*MOSCOW): 12}
+        assert len(api.requests) == requests
+
+    _run(service, scenario)
+    assert service.stale_served >= 5
+
+
+def test_breaker_half_open_probe(monkeypatch):
+    monkeypatch.setattr(weather, "BREAKER_COOLDOWN_SECONDS", 0.05)
+    api = FakeOpenMeteo(temperature=3)
+    service = _service(api, ttl=0)
+
+    async def scenario():
+        api.status_code = 500
+        for _ in range(weather.BREAKER_FAILURE_THRESHOLD):
+            assert await service.get_temp_c(*MOSCOW) is None
+        assert service.breaker_open
+
+        # После паузы одна неудачная проба снова размыкает предохранитель
+        await asyncio.sleep(0.06)
+        assert not service.breaker_open
+        assert await service.get_temp_c(*MOSCOW) is None
+        assert service.breaker_open
+
+        # Удачная проба замыкает его
+        await asyncio.sleep(0.06)
+        api.status_code = 200
+        assert await service.get_temp_c(*MOSCOW) == 3
+        api.status_code = 500
+        assert await service.get_temp_c(*MOSCOW) == 3
+        assert not service.breaker_open
+
+    _run(service, scenario)
+    assert len(api.requests) == weather.BREAKER_FAILURE_THRESHOLD + 3
+
+
+@pytest.mark.parametrize("cells", [1, 50, 120])
+def test_refresh_cells_in_batches(cells):
+    api = FakeOpenMeteo(temperature=-7.6)
+    service = _service(api)
+    grid = [(550 + i, 370) for i in range(cells)]
+
+    async def scenario():
+        # Первая ячейка уже в кэше и в запрос не попадает
+        await service.get_temp_c(*service.cell_center(grid[0]))
+        api.requests.clear()
+        return await service.refresh_cells(grid + grid[:3])
+
+    result = _run(service, scenario)
+    assert result == {cell: -8 for cell in grid}
+    expected = [min(weather.BATCH_SIZE, cells - 1 - i) for i in range(0, cells - 1, weather.BATCH_SIZE)]
+    assert api.points_per_request() == expected